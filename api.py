@@ -5,39 +5,236 @@ Provides endpoints for code generation and evaluation
 External Dependencies:
 - Flask (BSD-3-Clause): https://flask.palletsprojects.com
 - Flask-CORS (MIT): https://flask-cors.readthedocs.io
+- orjson (Apache-2.0 / MIT): https://github.com/ijl/orjson
+- gevent (MIT): https://www.gevent.org
 - See CREDITS.md for full attribution
 """
 
-from flask import Flask, request, jsonify
+if __name__ == '__main__':
+    # Patch blocking sockets before Flask and the Groq client (httpx) are imported,
+    # so in-flight LLM calls yield to other requests instead of blocking a worker
+    import sys
+    # httpcore optionally imports trio, whose epoll backend fails to import once gevent has
+    # removed select.epoll. The server never runs under trio, so make that import a clean miss.
+    sys.modules.setdefault('trio', None)
+    from gevent import monkey
+    monkey.patch_all()
+
+from flask import Flask, request, stream_with_context
+from flask.helpers import get_debug_flag
 from flask_cors import CORS
 import os
+import atexit
+import gzip
+import hashlib
+import hmac
+import logging
+import logging.handlers
+import queue
+import socket
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+import orjson
+from diskcache import Cache
+from gevent.pywsgi import WSGIServer
 from dotenv import load_dotenv
 
 load_dotenv()
 from hackathon import (
     generate_code,
+    get_fallback_code,
     evaluate_code,
-    calculate_production_score,
-    generate_recommendations,
-    refine_code_automatic
+    evaluate_bundle,
+    evaluate_structure,
+    refine_code_iter
 )
 
 app = Flask(__name__)
+app.config['PROPAGATE_EXCEPTIONS'] = False
+app.json.sort_keys = False
 CORS(app)
 
+# Request handlers only enqueue log records; a background listener formats and writes them
+_log_queue = queue.Queue(-1)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+log = logging.getLogger(__name__)
+
+# Warm up the analyzers (Radon, Bandit, AST) so the first request doesn't pay the cold start
+try:
+    evaluate_code("pass\n")
+except Exception as e:
+    log.warning("Analyzer warm-up failed: %s", e)
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if GROQ_API_KEY:
     os.environ["GROQ_API_KEY"] = GROQ_API_KEY
 
+# Static analysis is CPU-bound and holds the GIL, so it runs in worker processes
+_evaluator = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# Generated code per prompt, persisted across restarts. Bump the version
+# whenever the model or the generation prompt changes.
+GENERATION_CACHE_VERSION = "groq-v1"
+_generated_code = Cache(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".genc"))
+
+# Improvement runs in progress, keyed by a digest of (prompt, code)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Tracebacks of recent failures, readable through /api/errors
+_error_log = deque(maxlen=256)
+ERRORS_TOKEN = os.getenv("API_ERRORS_TOKEN")
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+# Evaluation results keyed by a BLAKE2 digest of the submitted code (LRU order)
+EVAL_CACHE_SIZE = 512
+_eval_cache = OrderedDict()
+_eval_cache_lock = threading.Lock()
+
+
+@dataclass
+class GenerateResponse:
+    """Body of a successful /api/generate response"""
+    success: bool
+    code: str
+    evaluation: dict
+    production_score: dict
+    recommendations: list
 
-@app.route('/api/health', methods=['GET'])
+
+@dataclass
+class EvaluateResponse:
+    """Body of a successful /api/evaluate response"""
+    success: bool
+    evaluation: dict
+    production_score: dict
+    recommendations: list
+
+
+@dataclass
+class ImproveResponse:
+    """Body of a successful /api/improve response"""
+    success: bool
+    original_code: str
+    improved_code: str
+    original_score: dict
+    original_evaluation: dict
+    final_score: dict
+    final_evaluation: dict
+    iterations: int
+    improvement_history: list
+    recommendations_applied: list  # Recommendations that were addressed
+    recommendations: list  # Remaining recommendations
+
+
+class NoDelayWSGIServer(WSGIServer):
+    """WSGIServer that disables Nagle's algorithm so small and streamed writes go out immediately"""
+
+    def handle(self, sock, address):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().handle(sock, address)
+
+
+def ojson(obj, status=200):
+    """
+    Serialize obj with orjson and wrap it in a JSON response.
+
+    Large bodies (e.g. /api/improve with its history and two evaluations) are
+    gzipped at level 1 when the client accepts it.
+    """
+    body = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Length"] = str(len(body))
+    return app.response_class(body, status=status, mimetype='application/json', headers=headers)
+
+
+def _evaluate_cached(code):
+    """
+    Evaluate and score code, reusing the result for code that was already seen.
+
+    Only the digest is kept as the key, so large submissions are not retained.
+    Returns (eval_results, production_score, recommendations).
+    """
+    key = hashlib.blake2b(code.encode(), digest_size=16).digest()
+    with _eval_cache_lock:
+        cached = _eval_cache.get(key)
+        if cached is not None:
+            _eval_cache.move_to_end(key)
+            return cached
+
+    # Evaluate outside the lock so other requests aren't held up behind it
+    cached = _evaluator.submit(evaluate_bundle, code).result()
+    with _eval_cache_lock:
+        _eval_cache[key] = cached
+        if len(_eval_cache) > EVAL_CACHE_SIZE:
+            _eval_cache.popitem(last=False)
+    return cached
+
+
+def _in_evaluator(fn):
+    """Wrap a one-argument analysis function so it runs in the evaluator processes"""
+    return lambda code: _evaluator.submit(fn, code).result()
+
+
+def _generate_code_cached(prompt, use_cache=True):
+    """Generate code for a prompt, reusing earlier LLM output for the same prompt"""
+    key = (GENERATION_CACHE_VERSION, prompt)
+    if use_cache:
+        code = _generated_code.get(key)
+        if code is not None:
+            return code
+
+    code = generate_code(prompt)
+    # Never persist the offline fallback, so the prompt is retried once the API is reachable
+    if code != get_fallback_code():
+        _generated_code.set(key, code)
+    return code
+
+
+def _record_error(context, e):
+    """Log a failed request and keep its traceback for /api/errors"""
+    log.error("Error in %s: %s", context, e)
+    _error_log.append(traceback.format_exc())
+
+
+def _trimmed(text):
+    """Strip surrounding whitespace, copying large code bodies only when there is any to strip"""
+    if text and (text[0].isspace() or text[-1].isspace()):
+        return text.strip()
+    return text
+
+
+def _json_in():
+    """Decode the request body with orjson (the body is only read once)"""
+    raw = request.get_data(cache=False)
+    return orjson.loads(raw) if raw else None
+
+
+# The health payload never changes while the process runs, so it is encoded once
+_HEALTH = orjson.dumps({
+    "status": "healthy",
+    "message": "AI Code Quality Evaluator API is running",
+    "api_key_set": bool(GROQ_API_KEY)
+})
+
+
+@app.route('/api/health', methods=['GET'], strict_slashes=False)
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "message": "AI Code Quality Evaluator API is running",
-        "api_key_set": bool(GROQ_API_KEY)
-    })
+    return app.response_class(_HEALTH, mimetype='application/json')
 
 
 @app.route('/api/generate', methods=['POST'])
@@ -50,6 +247,9 @@ def generate_code_endpoint():
         "prompt": "Create a REST API for user authentication"
     }
     
+    Code previously generated for the same prompt is reused; add ?nocache=1 (or true/yes)
+    to force a fresh LLM generation.
+    
     Response:
     {
         "code": "generated Python code",
@@ -59,44 +259,42 @@ def generate_code_endpoint():
     }
     """
     try:
-        data = request.get_json()
+        try:
+            data = _json_in()
+        except orjson.JSONDecodeError:
+            return ojson({"error": "Request body is not valid JSON"}, status=400)
         
         if not data or 'prompt' not in data:
-            return jsonify({"error": "Missing 'prompt' in request body"}), 400
+            return ojson({"error": "Missing 'prompt' in request body"}, status=400)
         
         prompt = data['prompt'].strip()
         
         if not prompt:
-            return jsonify({"error": "Prompt cannot be empty"}), 400
+            return ojson({"error": "Prompt cannot be empty"}, status=400)
         
         # Generate code
-        print(f"Generating code for prompt: {prompt[:100]}...")
-        generated_code = generate_code(prompt)
+        log.info("Generating code for prompt: %.100s...", prompt)
+        nocache = request.args.get('nocache', '').lower() in ('1', 'true', 'yes')
+        generated_code = _generate_code_cached(prompt, use_cache=not nocache)
         
         # Evaluate the generated code
-        print("Evaluating generated code...")
-        eval_results = evaluate_code(generated_code)
+        log.info("Evaluating generated code...")
+        eval_results, prod_score, recommendations = _evaluate_cached(generated_code)
         
-        # Calculate production score
-        prod_score = calculate_production_score(eval_results)
-        
-        # Generate recommendations
-        recommendations = generate_recommendations(eval_results)
-        
-        return jsonify({
-            "success": True,
-            "code": generated_code,
-            "evaluation": eval_results,
-            "production_score": prod_score,
-            "recommendations": recommendations
-        })
+        return ojson(GenerateResponse(
+            success=True,
+            code=generated_code,
+            evaluation=eval_results,
+            production_score=prod_score,
+            recommendations=recommendations
+        ))
         
     except Exception as e:
-        print(f"Error in generate endpoint: {e}")
-        return jsonify({
+        _record_error("generate endpoint", e)
+        return ojson({
             "success": False,
             "error": str(e)
-        }), 500
+        }, status=500)
 
 
 @app.route('/api/evaluate', methods=['POST'])
@@ -117,52 +315,142 @@ def evaluate_code_endpoint():
     }
     """
     try:
-        data = request.get_json()
+        try:
+            data = _json_in()
+        except orjson.JSONDecodeError:
+            return ojson({"error": "Request body is not valid JSON"}, status=400)
         
         if not data or 'code' not in data:
-            return jsonify({"error": "Missing 'code' in request body"}), 400
+            return ojson({"error": "Missing 'code' in request body"}, status=400)
         
-        code = data['code'].strip()
+        code = _trimmed(data['code'])
         
         if not code:
-            return jsonify({"error": "Code cannot be empty"}), 400
+            return ojson({"error": "Code cannot be empty"}, status=400)
         
         # Evaluate the Python code
-        print("Evaluating Python code...")
-        eval_results = evaluate_code(code)
-        prod_score = calculate_production_score(eval_results)
-        recommendations = generate_recommendations(eval_results)
+        log.info("Evaluating Python code...")
+        eval_results, prod_score, recommendations = _evaluate_cached(code)
         
-        return jsonify({
-            "success": True,
-            "evaluation": eval_results,
-            "production_score": prod_score,
-            "recommendations": recommendations
-        })
+        return ojson(EvaluateResponse(
+            success=True,
+            evaluation=eval_results,
+            production_score=prod_score,
+            recommendations=recommendations
+        ))
         
     except Exception as e:
-        print(f"Error in evaluate endpoint: {e}")
-        return jsonify({
+        _record_error("evaluate endpoint", e)
+        return ojson({
             "success": False,
             "error": str(e)
-        }), 500
-        
-        # Generate recommendations
-        recommendations = generate_recommendations(eval_results)
-        
-        return jsonify({
-            "success": True,
-            "evaluation": eval_results,
-            "production_score": prod_score,
-            "recommendations": recommendations
-        })
-        
+        }, status=500)
+
+
+def _improve_events(prompt, code, max_iterations):
+    """
+    Run the improvement pipeline, yielding progress events as it goes.
+
+    Emits "start" once the original code is scored, one "iteration" event per
+    refinement step and a final "result" event carrying the full response.
+    """
+    log.info("IMPROVEMENT REQUEST: improving Python code (max %s iterations)...", max_iterations)
+    
+    # Evaluate original code and get recommendations
+    original_eval, original_score, original_recommendations = _evaluate_cached(code)
+    
+    log.info("Original Score: %s/100", original_score['total_score'])
+    log.info("Original Recommendations: %d", len(original_recommendations))
+    if log.isEnabledFor(logging.INFO):
+        for i, rec in enumerate(original_recommendations[:5], 1):
+            log.info("  %d. %.80s...", i, rec)
+    
+    yield {
+        "event": "start",
+        "original_score": original_score,
+        "recommendations_count": len(original_recommendations)
+    }
+    
+    # Apply improvements based on recommendations
+    log.info("Starting AI-powered improvements based on recommendations...")
+    # Per-iteration analysis is CPU-bound, so keep it off the request thread/greenlet
+    steps = refine_code_iter(prompt, code, original_eval, original_score,
+                             evaluate=_in_evaluator(evaluate_code),
+                             structure=_in_evaluator(evaluate_structure))
+    for step in steps:
+        if step["event"] == "iteration":
+            yield step
+    improved_code, final_eval = step["code"], step["evaluation"]
+    final_score, final_recommendations = step["score"], step["recommendations"]
+    iterations, history = step["iterations"], step["history"]
+    
+    log.info(
+        "IMPROVEMENT COMPLETE: final score %s/100 (+%s points), %s iteration(s), %d recommendation(s) remaining",
+        final_score['total_score'],
+        final_score['total_score'] - original_score['total_score'],
+        iterations,
+        len(final_recommendations)
+    )
+    
+    yield {"event": "result", "result": ImproveResponse(
+        success=True,
+        original_code=code,
+        improved_code=improved_code,
+        original_score=original_score,
+        original_evaluation=original_eval,
+        final_score=final_score,
+        final_evaluation=final_eval,
+        iterations=iterations,
+        improvement_history=history,
+        recommendations_applied=original_recommendations,
+        recommendations=final_recommendations
+    )}
+
+
+def _coalesced_improve_events(prompt, code, max_iterations):
+    """
+    Yield improvement events, sharing one run between identical concurrent requests.
+
+    The first request for a (prompt, code) pair runs the pipeline and streams its
+    progress. Duplicates that arrive while it is running wait for its outcome and
+    receive only the final "result" event (or its error).
+    """
+    key = hashlib.blake2b(f"{prompt}\0{code}".encode(), digest_size=16).digest()
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        log.info("Joining in-flight improvement request")
+        yield {"event": "result", "result": future.result()}
+        return
+
+    try:
+        for event in _improve_events(prompt, code, max_iterations):
+            if event["event"] == "result":
+                future.set_result(event["result"])
+            yield event
     except Exception as e:
-        print(f"Error in evaluate endpoint: {e}")
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        if not future.done():
+            # The leading client disconnected before the run finished
+            future.set_exception(RuntimeError("Improvement request was cancelled"))
+
+
+def _ndjson(events):
+    """Encode events as newline-delimited JSON, reporting failures in-band"""
+    try:
+        for event in events:
+            yield orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    except Exception as e:
+        _record_error("improve stream", e)
+        yield orjson.dumps({"event": "error", "success": False, "error": str(e)}) + b"\n"
 
 
 @app.route('/api/improve', methods=['POST'])
@@ -189,75 +477,58 @@ def improve_code_endpoint():
         "recommendations_applied": [...],
         "recommendations": [...]
     }
+    
+    With "Accept: application/x-ndjson" the response is streamed instead, one JSON
+    event per line: {"event": "start"}, {"event": "iteration"} per refinement step,
+    then {"event": "result", "result": {...}} holding the response above.
     """
     try:
-        data = request.get_json()
+        try:
+            data = _json_in()
+        except orjson.JSONDecodeError:
+            return ojson({"error": "Request body is not valid JSON"}, status=400)
         
         if not data or 'code' not in data:
-            return jsonify({"error": "Missing 'code' in request body"}), 400
+            return ojson({"error": "Missing 'code' in request body"}, status=400)
         
-        code = data['code'].strip()
+        code = _trimmed(data['code'])
         prompt = data.get('prompt', 'Improve this code').strip()
         max_iterations = data.get('max_iterations', 8)
         
         if not code:
-            return jsonify({"error": "Code cannot be empty"}), 400
+            return ojson({"error": "Code cannot be empty"}, status=400)
         
-        print(f"\n{'='*60}")
-        print(f"IMPROVEMENT REQUEST")
-        print(f"{'='*60}")
-        print(f"Improving Python code (max {max_iterations} iterations)...")
+        events = _coalesced_improve_events(prompt, code, max_iterations)
+        if 'application/x-ndjson' in request.headers.get('Accept', ''):
+            return app.response_class(
+                stream_with_context(_ndjson(events)),
+                mimetype='application/x-ndjson'
+            )
         
-        # Evaluate original code and get recommendations
-        original_eval = evaluate_code(code)
-        original_score = calculate_production_score(original_eval)
-        original_recommendations = generate_recommendations(original_eval)
-        
-        print(f"\nOriginal Score: {original_score['total_score']}/100")
-        print(f"Original Recommendations: {len(original_recommendations)}")
-        for i, rec in enumerate(original_recommendations[:5], 1):
-            print(f"  {i}. {rec[:80]}...")
-        
-        # Apply improvements based on recommendations
-        print(f"\n🤖 Starting AI-powered improvements based on recommendations...")
-        improved_code, final_eval, iterations, history = refine_code_automatic(
-            prompt, code, original_eval
-        )
-        
-        final_score = calculate_production_score(final_eval)
-        final_recommendations = generate_recommendations(final_eval)
-        
-        print(f"\n{'='*60}")
-        print(f"IMPROVEMENT COMPLETE")
-        print(f"{'='*60}")
-        print(f"Final Score: {final_score['total_score']}/100")
-        print(f"Improvement: +{final_score['total_score'] - original_score['total_score']} points")
-        print(f"Iterations: {iterations}")
-        print(f"Remaining Recommendations: {len(final_recommendations)}")
-        print(f"{'='*60}\n")
-        
-        return jsonify({
-            "success": True,
-            "original_code": code,
-            "improved_code": improved_code,
-            "original_score": original_score,
-            "original_evaluation": original_eval,
-            "final_score": final_score,
-            "final_evaluation": final_eval,
-            "iterations": iterations,
-            "improvement_history": history,
-            "recommendations_applied": original_recommendations,  # Recommendations that were addressed
-            "recommendations": final_recommendations  # Remaining recommendations
-        })
+        for event in events:
+            pass
+        return ojson(event["result"])
         
     except Exception as e:
-        print(f"Error in improve endpoint: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
+        _record_error("improve endpoint", e)
+        return ojson({
             "success": False,
             "error": str(e)
-        }), 500
+        }, status=500)
+
+
+@app.route('/api/errors', methods=['GET'])
+def recent_errors():
+    """
+    Recent error tracebacks, newest last
+    
+    Only available when API_ERRORS_TOKEN is set; the request must send it in
+    the X-Admin-Token header.
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if not ERRORS_TOKEN or not hmac.compare_digest(token.encode(), ERRORS_TOKEN.encode()):
+        return ojson({"error": "Not found"}, status=404)
+    return ojson({"errors": list(_error_log)})
 
 
 if __name__ == '__main__':
@@ -270,8 +541,14 @@ if __name__ == '__main__':
     print("  POST /api/generate  - Generate code from prompt")
     print("  POST /api/evaluate  - Evaluate existing code")
     print("  POST /api/improve   - Apply iterative improvements")
+    print("  GET  /api/errors    - Recent error tracebacks (needs API_ERRORS_TOKEN)")
     print("\nStarting server on http://localhost:5001")
     print("Access from browser at: http://localhost:5001")
     print("="*60)
     
-    app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=False)
+    if get_debug_flag():
+        # Werkzeug dev server with the interactive debugger, for local development only.
+        # The debugger executes arbitrary code, so it is only reachable from this machine.
+        app.run(host='127.0.0.1', port=5001, debug=True, use_reloader=False)
+    else:
+        NoDelayWSGIServer(('0.0.0.0', 5001), app).serve_forever()
@@ -17,25 +17,155 @@ Evaluation Methodologies:
 See CREDITS.md for full attribution.
 """
 
+import io
 import os
-import re
+import sys
+import logging
 import tempfile
+import bisect
+import hashlib
+import functools
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Sequence
 from groq import Groq
 import ast
 import radon.complexity as complexity
 import radon.metrics as metrics
 from radon.raw import analyze
+from radon.visitors import ComplexityVisitor
 import subprocess
-import json
+try:
+    import orjson as json
+except ImportError:
+    import json
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 
+from llm_utils import extract_fenced, http_client
+
+try:
+    from bandit.core import config as bandit_config
+    from bandit.core import manager as bandit_manager
+    _BANDIT_CONFIG = bandit_config.BanditConfig()
+except ImportError:
+    bandit_manager = None
+
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
 
+client = Groq(api_key=GROQ_API_KEY, http_client=http_client) if GROQ_API_KEY else None
+
+# Analyzer results keyed by (function name, BLAKE2 digest of the code), in LRU order
+CONTENT_CACHE_SIZE = 256
+_content_cache = OrderedDict()
+_content_cache_lock = threading.Lock()
+
+
+# Static prompt text, built once at import instead of on every LLM call
+GENERATION_SYSTEM_PROMPT = """You are an expert Python developer who writes production-ready code with:
+- Clean, modular architecture following SOLID principles
+- Comprehensive error handling with try-except blocks and meaningful exceptions
+- Detailed docstrings for all functions and classes
+- Unit tests with assertions
+- Type hints where appropriate
+- Logging for debugging
+- Input validation
+- Security best practices (no hardcoded credentials, SQL injection prevention, etc.)
+- Include all necessary comments for clarity.
+
+Return ONLY the Python code without markdown formatting or explanations."""
+
+REFINEMENT_SYSTEM_PROMPT = """You are an expert Python developer focused on code quality.
+Given code with specific issues identified by tests and analysis, produce improved code that addresses ALL identified problems while maintaining functionality.
+Apply each recommendation precisely and completely.
+Return ONLY the complete improved Python code without explanations."""
+
+APPLY_RECOMMENDATIONS_SYSTEM_PROMPT = "You are an expert Python developer focused on improving code quality. Apply the listed recommendations to the provided code and return ONLY the complete improved Python code without any explanation or markdown."
+
+IMPROVEMENT_INSTRUCTIONS = """- Apply the specific fix mentioned
+- Maintain all original functionality
+- Ensure no breaking changes
+
+Additional requirements:
+1. Add comprehensive docstrings to every function and class
+2. Implement proper error handling with try-except blocks
+3. Add input validation for all user-facing functions
+4. Include logging statements for debugging
+5. Add unit tests with assertions
+6. Follow SOLID principles
+7. Ensure cyclomatic complexity < 10 for all functions
+8. Fix any security vulnerabilities
+
+Return ONLY the complete improved Python code without explanations or markdown formatting.
+"""
+
+
+
+def _has_error(result: dict) -> bool:
+    """True if an analyzer result (or one of its sections) reports a failure."""
+    return "error" in result or any(isinstance(v, dict) and "error" in v for v in result.values())
+
+
+def content_cached(func):
+    """
+    Memoize an analyzer on a hash of the code it analyzes.
+
+    The refinement loop re-evaluates code the LLM often returns unchanged, so
+    repeat calls are served from memory. Extra arguments are not part of the
+    key and must be derived from the code (e.g. its parsed AST facts). Results
+    that report an error (such as a Bandit timeout) are not cached.
+    """
+    @functools.wraps(func)
+    def wrapper(code, *args, **kwargs):
+        key = (func.__name__, hashlib.blake2b(code.encode(), digest_size=16).digest())
+        with _content_cache_lock:
+            if key in _content_cache:
+                _content_cache.move_to_end(key)
+                return _content_cache[key]
+
+        result = func(code, *args, **kwargs)
+        if not _has_error(result):
+            with _content_cache_lock:
+                _content_cache[key] = result
+                if len(_content_cache) > CONTENT_CACHE_SIZE:
+                    _content_cache.popitem(last=False)
+        return result
+
+    return wrapper
+
+
+
+def _complete_code(**request) -> str:
+    """
+    Stream a chat completion and return its fenced code, as extract_fenced() would.
+
+    Stops reading once the ```python block closes instead of waiting for any
+    explanation the model appends after it.
+    """
+    stream = client.chat.completions.create(stream=True, **request)
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            if "`" in delta:
+                text = "".join(parts)
+                start = text.find("```python")
+                if start >= 0 and text.find("```", start + len("```python")) >= 0:
+                    break
+    finally:
+        stream.close()
+    return extract_fenced("".join(parts))
 
 
 def generate_code(prompt: str) -> str:
@@ -46,7 +176,7 @@ def generate_code(prompt: str) -> str:
     See: https://groq.com
     """
     if not client:
-        print("No API key found. Using fallback generator.\n")
+        log.info("No API key found. Using fallback generator.")
         return get_fallback_code()
 
     # Try with the larger model first, then fall back to smaller model if rate limited
@@ -57,45 +187,29 @@ def generate_code(prompt: str) -> str:
     
     for model_name in models_to_try:
         try:
-            response = client.chat.completions.create(
+            code = _complete_code(
                 model=model_name,
                 messages=[
-                    {"role": "system", "content": """You are an expert Python developer who writes production-ready code with:
-- Clean, modular architecture following SOLID principles
-- Comprehensive error handling with try-except blocks and meaningful exceptions
-- Detailed docstrings for all functions and classes
-- Unit tests with assertions
-- Type hints where appropriate
-- Logging for debugging
-- Input validation
-- Security best practices (no hardcoded credentials, SQL injection prevention, etc.)
-- Include all necessary comments for clarity.
-
-Return ONLY the Python code without markdown formatting or explanations."""},
+                    {"role": "system", "content": GENERATION_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt},
                 ],
                 temperature=0.7,
                 max_tokens=4096,
             )
-            code = response.choices[0].message.content
-            if "```python" in code:
-                code = code.split("```python")[1].split("```")[0].strip()
-            elif "```" in code:
-                code = code.split("```")[1].split("```")[0].strip()
 
-            print(f"Code generated successfully using {model_name}.\n")
+            log.info("Code generated successfully using %s.", model_name)
             return code
         except Exception as e:
             error_msg = str(e)
             if "rate_limit" in error_msg.lower() and model_name != models_to_try[-1]:
-                print(f"Rate limit hit on {model_name}, trying next model...\n")
+                log.info("Rate limit hit on %s, trying next model...", model_name)
                 continue
             else:
-                print(f"Using fallback (mock) generator because of error: {e}\n")
+                log.info("Using fallback (mock) generator because of error: %s", e)
                 return get_fallback_code()
     
     # If all models failed
-    print("All models failed. Using fallback generator.\n")
+    log.info("All models failed. Using fallback generator.")
     return get_fallback_code()
 
 
@@ -112,6 +226,56 @@ if __name__ == '__main__':
 
 
 
+def _bandit_scan(code: str) -> list:
+    """Run Bandit in-process on the code and return its issues."""
+    # BanditManager only scans paths, so the code still goes through a temp file
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+        f.write(code)
+        temp_file = f.name
+
+    try:
+        manager = bandit_manager.BanditManager(_BANDIT_CONFIG, 'file')
+        manager.discover_files([temp_file])
+        manager.run_tests()
+        issues = manager.get_issue_list()
+    finally:
+        os.unlink(temp_file)
+
+    return [
+        {
+            "severity": issue.severity,
+            "confidence": issue.confidence,
+            "issue": issue.text,
+            "line": issue.lineno
+        }
+        for issue in issues
+    ]
+
+
+def _bandit_scan_subprocess(code: str) -> list:
+    """Fallback for when Bandit isn't importable: pipe the code to the CLI on stdin."""
+    result = subprocess.run(
+        ['bandit', '-f', 'json', '-'],
+        input=code.encode(),
+        capture_output=True,
+        timeout=10
+    )
+    if not result.stdout:
+        return []
+
+    bandit_data = json.loads(result.stdout)
+    return [
+        {
+            "severity": issue.get("issue_severity"),
+            "confidence": issue.get("issue_confidence"),
+            "issue": issue.get("issue_text"),
+            "line": issue.get("line_number")
+        }
+        for issue in bandit_data.get("results", [])
+    ]
+
+
+@content_cached
 def analyze_security(code: str) -> dict:
     """
     Analyze code for security vulnerabilities using Bandit.
@@ -122,35 +286,14 @@ def analyze_security(code: str) -> dict:
     results = {"security_issues": 0, "high_severity": 0, "issues": []}
 
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
-
-        result = subprocess.run(
-            ['bandit', '-r', temp_file, '-f', 'json'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-
-        os.unlink(temp_file)
+        if bandit_manager is not None:
+            issues = _bandit_scan(code)
+        else:
+            issues = _bandit_scan_subprocess(code)
 
-        if result.stdout:
-            bandit_data = json.loads(result.stdout)
-            results["security_issues"] = len(bandit_data.get("results", []))
-            results["high_severity"] = sum(
-                1 for issue in bandit_data.get("results", [])
-                if issue.get("issue_severity") == "HIGH"
-            )
-            results["issues"] = [
-                {
-                    "severity": issue.get("issue_severity"),
-                    "confidence": issue.get("issue_confidence"),
-                    "issue": issue.get("issue_text"),
-                    "line": issue.get("line_number")
-                }
-                for issue in bandit_data.get("results", [])[:5]
-            ]
+        results["security_issues"] = len(issues)
+        results["high_severity"] = sum(1 for issue in issues if issue["severity"] == "HIGH")
+        results["issues"] = issues[:5]
     except (subprocess.TimeoutExpired, FileNotFoundError, Exception) as e:
         results["error"] = f"Security scan unavailable: {str(e)}"
 
@@ -160,7 +303,90 @@ def analyze_security(code: str) -> dict:
 
 
 
-def analyze_error_handling(code: str) -> dict:
+VALIDATION_NAMES = frozenset({'isinstance', 'ValueError', 'TypeError'})
+TEST_FRAMEWORKS = frozenset({'unittest', 'pytest', 'nose', 'nose2'})
+
+
+@dataclass
+class CodeFacts:
+    """Structural facts about a module, collected in a single AST pass."""
+    functions: list = field(default_factory=list)        # every ast.FunctionDef
+    classes: list = field(default_factory=list)          # every ast.ClassDef
+    try_nodes: list = field(default_factory=list)        # every ast.Try
+    test_frameworks: dict = field(default_factory=dict)  # imported test frameworks as keys, deduplicated in source order
+    assertion_count: int = 0                             # assert statements and .assert*() calls
+    has_logging: bool = False                            # imports the logging module
+    has_validation: bool = False                         # isinstance/ValueError/TypeError/assert
+
+
+def _classify_import(facts: CodeFacts, name: str):
+    if name == 'logging' or name.startswith('logging.'):
+        facts.has_logging = True
+    package = name.split('.', 1)[0]
+    if package in TEST_FRAMEWORKS:
+        facts.test_frameworks[package] = None
+
+
+def collect_code_facts(tree: ast.AST) -> CodeFacts:
+    """
+    Walk the AST once and collect everything the structural analyzers need.
+
+    Visits nodes in the same breadth-first order as ast.walk(), but inlines the
+    traversal and binds the hot names to locals to avoid its per-node
+    generator overhead.
+
+    Uses Python AST module for code structure analysis.
+    See: https://docs.python.org/3/library/ast.html
+    """
+    facts = CodeFacts()
+    AST, Name, Call, Attribute = ast.AST, ast.Name, ast.Call, ast.Attribute
+    FunctionDef, ClassDef, Try = ast.FunctionDef, ast.ClassDef, ast.Try
+    Import, ImportFrom, Assert = ast.Import, ast.ImportFrom, ast.Assert
+    add_function, add_class, add_try = facts.functions.append, facts.classes.append, facts.try_nodes.append
+
+    todo = deque([tree])
+    next_node, enqueue = todo.popleft, todo.append
+    while todo:
+        node = next_node()
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, AST):
+                enqueue(value)
+            elif type(value) is list:
+                for item in value:
+                    if isinstance(item, AST):
+                        enqueue(item)
+
+        node_type = type(node)
+        if node_type is Name:
+            if node.id in VALIDATION_NAMES:
+                facts.has_validation = True
+        elif node_type is FunctionDef:
+            add_function(node)
+        elif node_type is ClassDef:
+            add_class(node)
+        elif node_type is Try:
+            add_try(node)
+        elif node_type is Import:
+            for alias in node.names:
+                _classify_import(facts, alias.name)
+        elif node_type is ImportFrom:
+            if node.module:
+                _classify_import(facts, node.module)
+        elif node_type is Assert:
+            facts.assertion_count += 1
+            facts.has_validation = True
+        elif node_type is Call:
+            if type(node.func) is Attribute and node.func.attr.startswith('assert'):
+                facts.assertion_count += 1
+
+    return facts
+
+
+
+
+
+def analyze_error_handling(code: str, facts: CodeFacts = None) -> dict:
     """
     Analyze error handling patterns in Python code.
     
@@ -177,9 +403,10 @@ def analyze_error_handling(code: str) -> dict:
     }
 
     try:
-        tree = ast.parse(code)
+        if facts is None:
+            facts = collect_code_facts(ast.parse(code))
 
-        try_nodes = [node for node in ast.walk(tree) if isinstance(node, ast.Try)]
+        try_nodes = facts.try_nodes
         results["has_try_except"] = len(try_nodes) > 0
         results["exception_count"] = len(try_nodes)
 
@@ -188,17 +415,13 @@ def analyze_error_handling(code: str) -> dict:
                 if handler.type is None:
                     results["bare_except_count"] += 1
 
-        class_nodes = [node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
-        for class_node in class_nodes:
+        for class_node in facts.classes:
             if any(isinstance(base, ast.Name) and 'Exception' in base.id 
                    for base in class_node.bases if isinstance(base, ast.Name)):
                 results["has_custom_exceptions"] = True
 
-        if re.search(r'import logging|from logging', code):
-            results["has_logging"] = True
-
-        if re.search(r'isinstance\(|ValueError|TypeError|assert.*>|assert.*<', code):
-            results["has_validation"] = True
+        results["has_logging"] = facts.has_logging
+        results["has_validation"] = facts.has_validation
 
     except SyntaxError:
         pass
@@ -209,7 +432,7 @@ def analyze_error_handling(code: str) -> dict:
 
 
 
-def analyze_solid_principles(code: str) -> dict:
+def analyze_solid_principles(code: str, facts: CodeFacts = None) -> dict:
     """
     Analyze adherence to SOLID principles, particularly Single Responsibility.
     
@@ -225,9 +448,10 @@ def analyze_solid_principles(code: str) -> dict:
     }
 
     try:
-        tree = ast.parse(code)
+        if facts is None:
+            facts = collect_code_facts(ast.parse(code))
 
-        classes = [node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
+        classes = facts.classes
         results["class_count"] = len(classes)
 
         method_counts = []
@@ -259,7 +483,7 @@ def analyze_solid_principles(code: str) -> dict:
 
 
 
-def analyze_test_coverage(code: str) -> dict:
+def analyze_test_coverage(code: str, facts: CodeFacts = None) -> dict:
     """
     Analyze test coverage and testing patterns.
     
@@ -273,29 +497,16 @@ def analyze_test_coverage(code: str) -> dict:
     }
 
     try:
-        tree = ast.parse(code)
+        if facts is None:
+            facts = collect_code_facts(ast.parse(code))
 
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    if any(fw in alias.name for fw in ['unittest', 'pytest', 'nose']):
-                        results["test_frameworks"].append(alias.name)
-            elif isinstance(node, ast.ImportFrom):
-                if node.module and any(fw in node.module for fw in ['unittest', 'pytest', 'nose']):
-                    results["test_frameworks"].append(node.module)
-
-        funcs = [node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
-        test_funcs = [f for f in funcs if f.name.startswith('test_')]
+        results["test_frameworks"] = list(facts.test_frameworks)
+
+        test_funcs = [f for f in facts.functions if f.name.startswith('test_')]
         results["test_functions"] = len(test_funcs)
         results["has_tests"] = len(test_funcs) > 0
 
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Assert):
-                results["assertion_count"] += 1
-            elif isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Attribute):
-                    if node.func.attr.startswith('assert'):
-                        results["assertion_count"] += 1
+        results["assertion_count"] = facts.assertion_count
 
     except SyntaxError:
         pass
@@ -306,7 +517,8 @@ def analyze_test_coverage(code: str) -> dict:
 
 
 
-def calculate_maintainability_index(code: str) -> dict:
+@content_cached
+def calculate_maintainability_index(code: str, tree: ast.AST = None) -> dict:
     """
     Calculate software maintainability metrics.
     
@@ -327,26 +539,26 @@ def calculate_maintainability_index(code: str) -> dict:
     }
 
     try:
+        if tree is None:
+            tree = ast.parse(code)
+
         # Get raw metrics
         raw_analysis = analyze(code)
         results["lloc"] = raw_analysis.lloc
         results["comments"] = raw_analysis.comments
-        
-        # Calculate Maintainability Index
-        # mi_visit with multi=True returns a single float (average across all functions)
-        mi_score = metrics.mi_visit(code, multi=True)
+
+        # Calculate Maintainability Index from the shared AST, using the same
+        # inputs as radon's mi_visit(code, multi=True) (multiline strings
+        # count as comments) without re-parsing the code for each metric
+        halstead_volume = metrics.h_visit_ast(tree).total.volume
+        total_complexity = ComplexityVisitor.from_ast(tree).total_complexity
+        comment_lines = raw_analysis.comments + raw_analysis.multi
+        comments_percent = comment_lines / float(raw_analysis.sloc) * 100 if raw_analysis.sloc else 0
+        mi_score = metrics.mi_compute(halstead_volume, total_complexity, raw_analysis.lloc, comments_percent)
         
         if mi_score is not None:
             results["maintainability_index"] = round(mi_score, 2)
-            
-            # Try to get Halstead volume
-            try:
-                h_result = metrics.h_visit(code)
-                if h_result:
-                    total_volume = sum(item.total.volume for item in h_result if hasattr(item, 'total') and item.total)
-                    results["halstead_volume"] = round(total_volume, 2)
-            except:
-                results["halstead_volume"] = 0
+            results["halstead_volume"] = round(halstead_volume, 2)
 
             # Microsoft Visual Studio Maintainability Index ranges
             # Source: https://learn.microsoft.com/en-us/visualstudio/code-quality/code-metrics-maintainability-index-range-and-meaning
@@ -373,15 +585,11 @@ def calculate_maintainability_index(code: str) -> dict:
 
 
 
-def evaluate_code(code: str) -> dict:
+def _parse_for_evaluation(code: str) -> tuple:
     """
-    Comprehensive code quality evaluation.
-    
-    Combines multiple analysis methods:
-    - Syntax validation (Python AST)
-    - Complexity analysis (Radon)
-    - Security scanning (Bandit)
-    - Best practices checking
+    Parse the code and fill in the basic metrics shared by both evaluation passes.
+
+    Returns: (results, tree, facts); tree and facts are None on a syntax error
     """
     results = {
         "syntax_ok": False,
@@ -389,30 +597,64 @@ def evaluate_code(code: str) -> dict:
         "avg_complexity": 0,
         "has_docstrings": False
     }
+    tree = facts = None
 
     try:
         tree = ast.parse(code)
         results["syntax_ok"] = True
 
-        funcs = [node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
-        results["functions"] = len(funcs)
-
-        docstrings = [ast.get_docstring(f) for f in funcs if ast.get_docstring(f)]
-        results["has_docstrings"] = len(docstrings) > 0
+        # One AST pass feeds every structural analyzer
+        facts = collect_code_facts(tree)
+        results["functions"] = len(facts.functions)
+        results["has_docstrings"] = any(ast.get_docstring(f) for f in facts.functions)
 
-        analyzed = complexity.cc_visit(code)
+        analyzed = complexity.cc_visit_ast(tree)
         if analyzed:
             results["avg_complexity"] = round(sum(x.complexity for x in analyzed) / len(analyzed), 2)
 
     except SyntaxError:
         results["syntax_ok"] = False
 
+    return results, tree, facts
+
+
+@content_cached
+def evaluate_structure(code: str) -> dict:
+    """
+    Fast pass of evaluate_code(): syntax, complexity and the AST-based analyzers.
+
+    Skips Bandit and the Radon maintainability index, so "security" and
+    "maintainability" are absent from the result.
+    """
+    results, tree, facts = _parse_for_evaluation(code)
+
+    if results["syntax_ok"]:
+        results["error_handling"] = analyze_error_handling(code, facts)
+        results["solid_principles"] = analyze_solid_principles(code, facts)
+        results["test_coverage"] = analyze_test_coverage(code, facts)
+
+    return results
+
+
+@content_cached
+def evaluate_code(code: str) -> dict:
+    """
+    Comprehensive code quality evaluation.
+    
+    Combines multiple analysis methods:
+    - Syntax validation (Python AST)
+    - Complexity analysis (Radon)
+    - Security scanning (Bandit)
+    - Best practices checking
+    """
+    results, tree, facts = _parse_for_evaluation(code)
+
     if results["syntax_ok"]:
         results["security"] = analyze_security(code)
-        results["error_handling"] = analyze_error_handling(code)
-        results["solid_principles"] = analyze_solid_principles(code)
-        results["test_coverage"] = analyze_test_coverage(code)
-        results["maintainability"] = calculate_maintainability_index(code)
+        results["error_handling"] = analyze_error_handling(code, facts)
+        results["solid_principles"] = analyze_solid_principles(code, facts)
+        results["test_coverage"] = analyze_test_coverage(code, facts)
+        results["maintainability"] = calculate_maintainability_index(code, tree)
 
     return results
 
@@ -420,6 +662,13 @@ def evaluate_code(code: str) -> dict:
 
 
 
+# Points available per score category (excellence bonuses aside)
+MAX_POINTS = {"syntax": 20, "documentation": 15, "complexity": 15,
+              "security": 20, "error_handling": 10, "tests": 10,
+              "maintainability": 10}
+CATEGORY_TITLES = {category: category.title() for category in MAX_POINTS}
+
+
 def calculate_production_score(eval_results: dict) -> dict:
     """
     Calculate production readiness score (0-100+ scale with bonuses).
@@ -614,7 +863,30 @@ def calculate_production_score(eval_results: dict) -> dict:
 
 
 
-def should_continue_refinement(current_score: int, previous_scores: list, iteration: int, max_iterations: int) -> dict:
+def best_case_score(structure: dict) -> int:
+    """
+    Upper bound on the production score of code given only its evaluate_structure() results.
+
+    Assumes a clean Bandit scan and a perfect maintainability index, the two
+    parts of the score the fast pass doesn't measure.
+    """
+    if not structure["syntax_ok"]:
+        return 0
+    best_case = {
+        **structure,
+        "security": {"security_issues": 0, "high_severity": 0},
+        "maintainability": {"maintainability_index": 100}
+    }
+    return calculate_production_score(best_case)["total_score"]
+
+
+
+
+
+PLATEAU_THRESHOLD = 1  # minimum points gained per iteration to keep refining
+
+
+def should_continue_refinement(current_score: int, previous_scores: Sequence, iteration: int, max_iterations: int) -> dict:
     """
     Intelligent stopping criterion for iterative refinement.
     
@@ -637,12 +909,12 @@ def should_continue_refinement(current_score: int, previous_scores: list, iterat
         result["reason"] = "Maximum iterations reached"
         return result
 
-    # Check for plateau (less than 1 point improvement in last 2 iterations)
+    # Check for plateau (less than PLATEAU_THRESHOLD points gained since the last iteration)
     if len(previous_scores) >= 2:
         recent_improvement = current_score - previous_scores[-1]
         result["improvement_rate"] = recent_improvement
 
-        if recent_improvement < 1 and len(previous_scores) >= 2:
+        if recent_improvement < PLATEAU_THRESHOLD:
             result["reached_plateau"] = True
             result["reason"] = f"Minimal improvement detected ({recent_improvement} points). Convergence plateau reached."
             return result
@@ -656,32 +928,24 @@ def should_continue_refinement(current_score: int, previous_scores: list, iterat
     else:
         result["reason"] = f"Continue refinement to improve from {current_score}/100"
     return result
-    if len(previous_scores) >= 2:
-        recent_improvement = current_score - previous_scores[-1]
-        result["improvement_rate"] = recent_improvement
 
-        if recent_improvement < 2 and len(previous_scores) >= 2:
-            result["reached_plateau"] = True
-            result["reason"] = f"Minimal improvement detected ({recent_improvement}% gain). Convergence plateau reached."
-            return result
 
-    # Continue refinement
-    result["should_continue"] = True
-    result["reason"] = f"Continue refinement to improve from {current_score}/100"
-    return result
 
 
 
-
-
-def build_improvement_prompt(original_prompt: str, code: str, eval_results: dict, recommendations: list) -> str:
+def build_improvement_prompt(original_prompt: str, code: str, eval_results: dict, recommendations: list,
+                             prod_score: dict = None) -> str:
     """
     Build prompt for iterative code improvement based on test results and recommendations.
     
     Custom prompt engineering for LLM-based code refinement.
     Makes it explicit that the LLM should apply the specific recommendations.
+    Pass prod_score when the production score of eval_results is already known.
     """
-    prod_score = calculate_production_score(eval_results)
+    if prod_score is None:
+        prod_score = calculate_production_score(eval_results)
+
+    numbered_recommendations = "".join(f"{i}. {rec}\n" for i, rec in enumerate(recommendations, 1))
 
     improvement_prompt = f"""TASK: Improve the following Python code based on quality analysis and test results.
 
@@ -702,31 +966,11 @@ QUALITY ANALYSIS RESULTS (Based on Tests):
 - Maintainability Index: {eval_results.get('maintainability', {}).get('maintainability_index', 0)}
 
 SPECIFIC RECOMMENDATIONS TO APPLY (from test results):
-"""
-
-    for i, rec in enumerate(recommendations, 1):
-        improvement_prompt += f"{i}. {rec}\n"
-
-    improvement_prompt += f"""
+{numbered_recommendations}
 
 INSTRUCTIONS FOR IMPROVED CODE:
 You MUST address ALL {len(recommendations)} recommendations listed above. For each recommendation:
-- Apply the specific fix mentioned
-- Maintain all original functionality
-- Ensure no breaking changes
-
-Additional requirements:
-1. Add comprehensive docstrings to every function and class
-2. Implement proper error handling with try-except blocks
-3. Add input validation for all user-facing functions
-4. Include logging statements for debugging
-5. Add unit tests with assertions
-6. Follow SOLID principles
-7. Ensure cyclomatic complexity < 10 for all functions
-8. Fix any security vulnerabilities
-
-Return ONLY the complete improved Python code without explanations or markdown formatting.
-"""
+{IMPROVEMENT_INSTRUCTIONS}"""
 
     return improvement_prompt
 
@@ -734,61 +978,72 @@ Return ONLY the complete improved Python code without explanations or markdown f
 
 
 
-def refine_code_automatic(original_prompt: str, code: str, eval_results: dict) -> tuple:
+def refine_code_iter(original_prompt: str, code: str, eval_results: dict, score: dict = None,
+                     evaluate=evaluate_code, structure=evaluate_structure):
     """
-    Automatic iterative code refinement system based on test results and recommendations.
-    
-    Custom algorithm with intelligent stopping based on:
-    - Score improvement tracking
-    - Convergence detection
-    - Maximum iteration limits
-    
-    The LLM applies recommendations generated from test/evaluation results.
+    Generator form of refine_code_automatic() for callers that report progress.
+
+    Yields {"event": "iteration", ...} with each improvement history entry as it is
+    recorded, then a final {"event": "complete", "code", "evaluation", "score",
+    "recommendations", "iterations", "history"} event describing the refined result.
+    Pass score when the production score of eval_results is already known, and
+    evaluate/structure to run the per-iteration analysis somewhere else (e.g. a process pool).
     """
     if not client:
-        print("API not available. Cannot refine code.")
-        return code, eval_results, 0, []
+        log.info("API not available. Cannot refine code.")
+        yield {
+            "event": "complete",
+            "code": code,
+            "evaluation": eval_results,
+            "score": score or calculate_production_score(eval_results),
+            "recommendations": generate_recommendations(eval_results),
+            "iterations": 0,
+            "history": []
+        }
+        return
 
     current_code = code
     current_eval = eval_results
     improvement_history = []
-    score_history = []
+    previous_scores = deque(maxlen=2)  # the plateau check only looks this far back
     iteration = 0
     max_auto_iterations = 8
+    prod_score = score  # score of current_eval, carried over from the last accepted refinement
 
     while iteration < max_auto_iterations:
         iteration += 1
 
         # Calculate current score
-        prod_score = calculate_production_score(current_eval)
+        if prod_score is None:
+            prod_score = calculate_production_score(current_eval)
         current_score = prod_score['total_score']
-        score_history.append(current_score)
 
         # Check convergence
         convergence = should_continue_refinement(
             current_score, 
-            score_history[:-1],  # Previous scores
+            previous_scores,
             iteration,
             max_auto_iterations
         )
+        previous_scores.append(current_score)
 
         # Generate recommendations based on current evaluation
         recommendations = generate_recommendations(current_eval)
 
         # Track history
-        improvement_history.append({
+        entry = {
             "iteration": iteration,
             "score": current_score,
             "rating": prod_score['rating'],
             "reason": convergence.get("reason", ""),
             "recommendations_count": len(recommendations)
-        })
+        }
+        improvement_history.append(entry)
+        yield {"event": "iteration", **entry}
 
-        print(f"\n{'='*50}")
-        print(f"Iteration {iteration}: Score {current_score}/100 ({prod_score['rating']})")
-        print(f"   {convergence['reason']}")
-        print(f"   Recommendations to apply: {len(recommendations)}")
-        print(f"{'='*50}")
+        log.info("Iteration %d: Score %s/100 (%s)", iteration, current_score, prod_score['rating'])
+        log.info("   %s", convergence['reason'])
+        log.info("   Recommendations to apply: %d", len(recommendations))
 
         if not convergence["should_continue"]:
             break
@@ -798,73 +1053,229 @@ def refine_code_automatic(original_prompt: str, code: str, eval_results: dict) -
             original_prompt,
             current_code,
             current_eval,
-            recommendations
+            recommendations,
+            prod_score
         )
 
         # Generate improved code by applying recommendations
         try:
-            print(f"\n🤖 Applying {len(recommendations)} recommendation(s) via LLM...")
-            for i, rec in enumerate(recommendations[:3], 1):  # Show first 3
-                print(f"   {i}. {rec[:70]}...")
+            log.info("🤖 Applying %d recommendation(s) via LLM...", len(recommendations))
+            if log.isEnabledFor(logging.INFO):
+                for i, rec in enumerate(recommendations[:3], 1):  # Show first 3
+                    log.info("   %d. %.70s...", i, rec)
             
-            response = client.chat.completions.create(
+            improved_code = _complete_code(
                 model="llama-3.3-70b-versatile",
                 messages=[
-                    {"role": "system", "content": """You are an expert Python developer focused on code quality.
-Given code with specific issues identified by tests and analysis, produce improved code that addresses ALL identified problems while maintaining functionality.
-Apply each recommendation precisely and completely.
-Return ONLY the complete improved Python code without explanations."""},
+                    {"role": "system", "content": REFINEMENT_SYSTEM_PROMPT},
                     {"role": "user", "content": improvement_prompt},
                 ],
                 temperature=0.5,
                 max_tokens=4096,
             )
 
-            improved_code = response.choices[0].message.content
-
-            if "```python" in improved_code:
-                improved_code = improved_code.split("```python")[1].split("```")[0].strip()
-            elif "```" in improved_code:
-                improved_code = improved_code.split("```")[1].split("```")[0].strip()
+            # Skip Bandit/Radon when the code can't beat the current score even with perfect results there
+            if best_case_score(structure(improved_code)) <= current_score:
+                log.info("   ⚠️  No improvement possible. Stopping refinement.")
+                break
 
             # Evaluate improved code
-            print(f"   ✓ Code improved, re-evaluating...")
-            new_eval = evaluate_code(improved_code)
+            log.info("   ✓ Code improved, re-evaluating...")
+            new_eval = evaluate(improved_code)
             new_score = calculate_production_score(new_eval)
 
             if new_score['total_score'] > current_score:
-                print(f"   ✅ Score improved: {current_score} → {new_score['total_score']} (+{new_score['total_score'] - current_score})")
+                log.info("   ✅ Score improved: %s → %s (+%s)",
+                         current_score, new_score['total_score'], new_score['total_score'] - current_score)
                 current_code = improved_code
                 current_eval = new_eval
+                prod_score = new_score
             else:
-                print(f"   ⚠️  No improvement. Stopping refinement.")
+                log.info("   ⚠️  No improvement. Stopping refinement.")
                 break
 
         except Exception as e:
-            print(f"   ❌ Refinement failed: {e}")
+            log.info("   ❌ Refinement failed: %s", e)
             break
 
-    print(f"\n{'='*50}")
-    print(f"REFINEMENT COMPLETE: {iteration} iteration(s)")
-    print(f"{'='*50}\n")
+    log.info("REFINEMENT COMPLETE: %d iteration(s)", iteration)
+
+    # The last loop pass always scored current_eval, so its score and recommendations are final
+    yield {
+        "event": "complete",
+        "code": current_code,
+        "evaluation": current_eval,
+        "score": prod_score,
+        "recommendations": recommendations,
+        "iterations": iteration,
+        "history": improvement_history
+    }
+
+
+
+
+
+def refine_code_automatic(original_prompt: str, code: str, eval_results: dict, score: dict = None) -> tuple:
+    """
+    Automatic iterative code refinement system based on test results and recommendations.
+    
+    Custom algorithm with intelligent stopping based on:
+    - Score improvement tracking
+    - Convergence detection
+    - Maximum iteration limits
+    
+    The LLM applies recommendations generated from test/evaluation results.
+
+    Returns: (code, eval_results, production_score, recommendations, iterations, history)
+    """
+    for step in refine_code_iter(original_prompt, code, eval_results, score):
+        pass
+    return (
+        step["code"],
+        step["evaluation"],
+        step["score"],
+        step["recommendations"],
+        step["iterations"],
+        step["history"]
+    )
+
+
+
+
+
+# Static sections of generate_documentation, built once at import time
+DOC_METRICS_HEADER = """---
+
+## 3. Code Quality Metrics
+
+### Basic Metrics
+"""
+
+DOC_SCORE_BREAKDOWN_HEADER = """
+
+---
+
+## 4. Score Breakdown
+
+"""
+
+DOC_RECOMMENDATIONS_HEADER = """
+
+---
+
+## 5. Recommendations
+
+"""
+
+DOC_CODE_HEADER = """
+
+---
+
+## 6. Generated Code
+
+```python
+"""
+
+DOC_USAGE_NOTES = """
+```
+
+---
+
+## 7. Usage Notes
+
+- This code was automatically generated and refined for production readiness
+- Review security issues before deploying to production
+- Run the included unit tests before integration
+- Consider additional testing for edge cases
+- Document any custom configurations or environment variables needed
+- Ensure all dependencies are properly installed: `pip install -r requirements.txt`
+
+---
 
-    return current_code, current_eval, iteration, improvement_history
+*Documentation generated automatically by AI Code Quality Evaluator*
+"""
 
 
+def _fmt_list(items, limit=None, empty="None") -> str:
+    """Join names for display; the empty and single-name cases skip the join."""
+    if not items:
+        return empty
+    if len(items) == 1:
+        return items[0]
+    if limit and len(items) > limit:
+        return ", ".join(items[:limit]) + "..."
+    return ", ".join(items)
 
 
+def _build_report_model(eval_results: dict, prod_score: dict) -> dict:
+    """
+    Pre-compute the values shared by the Markdown and console reports.
 
-def generate_documentation(prompt: str, code: str, eval_results: dict, improvement_history: list) -> str:
+    generate_documentation and report_results read the same fields and differ
+    only in presentation, so the lookups and formatting happen once here.
+    """
+    def yes_no(value):
+        return 'Yes' if value else 'No'
+
+    mi = eval_results.get('maintainability', {})
+    sec = eval_results.get('security', {})
+    err = eval_results.get('error_handling', {})
+    tests = eval_results.get('test_coverage', {})
+    solid = eval_results.get('solid_principles', {})
+
+    breakdown_rows = []
+    for category, points in prod_score['breakdown'].items():
+        max_points = MAX_POINTS.get(category, 10)
+        # bonus_reasons list, or "FAIL" when the code doesn't parse, has no percentage
+        percentage = points * 100 / max_points if isinstance(points, (int, float)) else None
+        breakdown_rows.append((CATEGORY_TITLES.get(category) or category.title(), points, max_points, percentage))
+
+    return {
+        'breakdown_rows': breakdown_rows,
+        'syntax_ok': yes_no(eval_results['syntax_ok']),
+        'functions': eval_results.get('functions', 0),
+        'avg_complexity': eval_results.get('avg_complexity', 0),
+        'has_docstrings': yes_no(eval_results.get('has_docstrings')),
+        'mi_index': mi.get('maintainability_index', 0),
+        'mi_rating': mi.get('rating', 'N/A'),
+        'halstead_volume': f"{mi.get('halstead_volume', 0):.2f}",
+        'lloc': mi.get('lloc', 0),
+        'security_error': sec.get('error'),
+        'security_issues': sec.get('security_issues', 0),
+        'high_severity': sec.get('high_severity', 0),
+        'top_issues': [f"Line {issue['line']}: {issue['issue']} [{issue['severity']}]"
+                       for issue in sec.get('issues', [])[:5]],
+        'exception_count': err.get('exception_count', 0),
+        'bare_except_count': err.get('bare_except_count', 0),
+        'has_logging': yes_no(err.get('has_logging')),
+        'has_validation': yes_no(err.get('has_validation')),
+        'has_tests': yes_no(tests.get('has_tests')),
+        'test_functions': tests.get('test_functions', 0),
+        'assertion_count': tests.get('assertion_count', 0),
+        'test_frameworks': _fmt_list(tests.get('test_frameworks'), empty=''),
+        'srp_score': f"{solid.get('srp_score', 0):.1f}",
+        'class_count': solid.get('class_count', 0),
+        'god_classes': _fmt_list(solid.get('god_classes'), empty=''),
+        'long_methods': _fmt_list(solid.get('long_methods'), empty=''),
+    }
+
+
+def generate_documentation(prompt: str, code: str, eval_results: dict, improvement_history: list,
+                           recommendations: list = None, prod_score: dict = None) -> str:
     """
     Generate comprehensive project documentation.
     
     Custom documentation generator for evaluation results.
+    Pass recommendations and prod_score when they are already known for eval_results.
     """
   
-    prod_score = calculate_production_score(eval_results)
+    if prod_score is None:
+        prod_score = calculate_production_score(eval_results)
+    model = _build_report_model(eval_results, prod_score)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    doc = f"""# Auto-Generated Project Documentation
+    doc = io.StringIO()
+    doc.write(f"""# Auto-Generated Project Documentation
 
 **Generated:** {timestamp}
 
@@ -915,123 +1326,102 @@ export GROQ_API_KEY="your_groq_api_key_here"
 
 ## 2. Refinement History
 
-"""
+""")
 
     if improvement_history:
-        doc += "| Iteration | Score | Rating | Notes |\n"
-        doc += "|-----------|-------|--------|-------|\n"
-        for entry in improvement_history:
-            reason = entry.get('reason', 'Initial')[:50]
-            doc += f"| {entry['iteration']} | {entry['score']}/100 | {entry['rating']} | {reason} |\n"
-        doc += "\n"
-
-    doc += """---
-
-## 3. Code Quality Metrics
-
-### Basic Metrics
-"""
-    doc += f"- **Functions:** {eval_results.get('functions', 0)}\n"
-    doc += f"- **Syntax Valid:** {'Yes' if eval_results['syntax_ok'] else 'No'}\n"
-    doc += f"- **Average Complexity:** {eval_results.get('avg_complexity', 0)}\n"
-    doc += f"- **Has Docstrings:** {'Yes' if eval_results.get('has_docstrings') else 'No'}\n"
-
-    doc += "\n### Maintainability"
-    mi = eval_results.get('maintainability', {})
-    doc += f"\n- **Maintainability Index:** {mi.get('maintainability_index', 0)} ({mi.get('rating', 'N/A')})\n"
-    doc += f"- **Halstead Volume:** {mi.get('halstead_volume', 0):.2f}\n"
-    doc += f"- **Logical Lines of Code:** {mi.get('lloc', 0)}\n"
-
-    doc += "\n### Security"
-    sec = eval_results.get('security', {})
-    if 'error' not in sec:
-        doc += f"\n- **Total Issues:** {sec.get('security_issues', 0)}\n"
-        doc += f"- **High Severity:** {sec.get('high_severity', 0)}\n"
-        if sec.get('issues'):
-            doc += "\n**Issues Found:**\n"
-            for issue in sec['issues'][:5]:
-                doc += f"  - Line {issue['line']}: {issue['issue']} [{issue['severity']}]\n"
-
-    doc += "\n### Error Handling"
-    err = eval_results.get('error_handling', {})
-    doc += f"\n- **Try-Except Blocks:** {err.get('exception_count', 0)}\n"
-    doc += f"- **Bare Except Clauses:** {err.get('bare_except_count', 0)}\n"
-    doc += f"- **Has Logging:** {'Yes' if err.get('has_logging') else 'No'}\n"
-    doc += f"- **Input Validation:** {'Yes' if err.get('has_validation') else 'No'}\n"
-
-    doc += "\n### Test Coverage"
-    tests = eval_results.get('test_coverage', {})
-    doc += f"\n- **Test Functions:** {tests.get('test_functions', 0)}\n"
-    doc += f"- **Assertions:** {tests.get('assertion_count', 0)}\n"
-    doc += f"- **Frameworks:** {', '.join(tests.get('test_frameworks', [])) if tests.get('test_frameworks') else 'None'}\n"
-
-    doc += "\n### SOLID Principles"
-    solid = eval_results.get('solid_principles', {})
-    doc += f"\n- **SRP Score:** {solid.get('srp_score', 0):.1f}/100\n"
-    doc += f"- **Class Count:** {solid.get('class_count', 0)}\n"
-    if solid.get('god_classes'):
-        doc += f"- **God Classes:** {', '.join(solid['god_classes'])}\n"
-    if solid.get('long_methods'):
-        doc += f"- **Long Methods:** {', '.join(solid['long_methods'])}\n"
-
-    doc += f"""
-
----
-
-## 4. Score Breakdown
-
-"""
-    for category, points in prod_score['breakdown'].items():
-        max_points = {"syntax": 20, "documentation": 15, "complexity": 15, 
-                     "security": 20, "error_handling": 10, "tests": 10, 
-                     "maintainability": 10}.get(category, 10)
-        percentage = (points / max_points * 100) if max_points > 0 else 0
-        doc += f"- **{category.title()}:** {points}/{max_points} ({percentage:.0f}%)\n"
-
-    recommendations = generate_recommendations(eval_results)
-    doc += f"""
-
----
-
-## 5. Recommendations
+        doc.write("| Iteration | Score | Rating | Notes |\n")
+        doc.write("|-----------|-------|--------|-------|\n")
+        doc.writelines(
+            f"| {entry['iteration']} | {entry['score']}/100 | {entry['rating']} | {entry.get('reason', 'Initial')[:50]} |\n"
+            for entry in improvement_history
+        )
+        doc.write("\n")
+
+    doc.write(DOC_METRICS_HEADER)
+    doc.write(f"- **Functions:** {model['functions']}\n")
+    doc.write(f"- **Syntax Valid:** {model['syntax_ok']}\n")
+    doc.write(f"- **Average Complexity:** {model['avg_complexity']}\n")
+    doc.write(f"- **Has Docstrings:** {model['has_docstrings']}\n")
+
+    doc.write("\n### Maintainability")
+    doc.write(f"\n- **Maintainability Index:** {model['mi_index']} ({model['mi_rating']})\n")
+    doc.write(f"- **Halstead Volume:** {model['halstead_volume']}\n")
+    doc.write(f"- **Logical Lines of Code:** {model['lloc']}\n")
+
+    doc.write("\n### Security")
+    if model['security_error'] is None:
+        doc.write(f"\n- **Total Issues:** {model['security_issues']}\n")
+        doc.write(f"- **High Severity:** {model['high_severity']}\n")
+        if model['top_issues']:
+            doc.write("\n**Issues Found:**\n")
+            doc.writelines(f"  - {issue}\n" for issue in model['top_issues'])
+
+    doc.write("\n### Error Handling")
+    doc.write(f"\n- **Try-Except Blocks:** {model['exception_count']}\n")
+    doc.write(f"- **Bare Except Clauses:** {model['bare_except_count']}\n")
+    doc.write(f"- **Has Logging:** {model['has_logging']}\n")
+    doc.write(f"- **Input Validation:** {model['has_validation']}\n")
+
+    doc.write("\n### Test Coverage")
+    doc.write(f"\n- **Test Functions:** {model['test_functions']}\n")
+    doc.write(f"- **Assertions:** {model['assertion_count']}\n")
+    doc.write(f"- **Frameworks:** {model['test_frameworks'] or 'None'}\n")
+
+    doc.write("\n### SOLID Principles")
+    doc.write(f"\n- **SRP Score:** {model['srp_score']}/100\n")
+    doc.write(f"- **Class Count:** {model['class_count']}\n")
+    if model['god_classes']:
+        doc.write(f"- **God Classes:** {model['god_classes']}\n")
+    if model['long_methods']:
+        doc.write(f"- **Long Methods:** {model['long_methods']}\n")
+
+    doc.write(DOC_SCORE_BREAKDOWN_HEADER)
+    doc.writelines(
+        f"- **{label}:** {points}/{max_points} ({percentage:.0f}%)\n"
+        for label, points, max_points, percentage in model['breakdown_rows']
+        if percentage is not None
+    )
 
-"""
+    if recommendations is None:
+        recommendations = generate_recommendations(eval_results)
+    doc.write(DOC_RECOMMENDATIONS_HEADER)
     if recommendations:
-        for i, rec in enumerate(recommendations, 1):
-            doc += f"{i}. {rec}\n"
+        doc.writelines(f"{i}. {rec}\n" for i, rec in enumerate(recommendations, 1))
     else:
-        doc += "No major recommendations. Code is well-structured!\n"
+        doc.write("No major recommendations. Code is well-structured!\n")
 
-    doc += f"""
+    # Stream the (possibly tens of KB) code straight into the buffer instead of
+    # interpolating it into the surrounding template first
+    doc.write(DOC_CODE_HEADER)
+    doc.write(code)
+    doc.write(DOC_USAGE_NOTES)
 
----
+    return doc.getvalue()
 
-## 6. Generated Code
 
-```python
-{code}
-```
 
----
-
-## 7. Usage Notes
-
-- This code was automatically generated and refined for production readiness
-- Review security issues before deploying to production
-- Run the included unit tests before integration
-- Consider additional testing for edge cases
-- Document any custom configurations or environment variables needed
-- Ensure all dependencies are properly installed: `pip install -r requirements.txt`
-
----
-
-*Documentation generated automatically by AI Code Quality Evaluator*
-"""
-
-    return doc
 
 
+# Recommendation templates per tier, indexed by bisecting the tier thresholds;
+# None means the tier needs no recommendation
+COMPLEXITY_THRESHOLDS = (5, 10, 15)  # tiers start above each threshold
+COMPLEXITY_RECOMMENDATIONS = (
+    None,
+    "Consider simplifying moderately complex functions (complexity {complexity:.1f}) for long-term maintainability",
+    "Refactor complex functions (complexity {complexity:.1f} > 10) to improve readability and testability",
+    "Critical: Refactor highly complex functions (complexity {complexity:.1f} > 15). Break into smaller, single-responsibility functions",
+)
 
+# Maintainability Index (Microsoft Visual Studio ranges); tiers start at each threshold
+# Source: https://learn.microsoft.com/en-us/visualstudio/code-quality/code-metrics-maintainability-index-range-and-meaning
+MAINTAINABILITY_THRESHOLDS = (20, 60, 80, 90)
+MAINTAINABILITY_RECOMMENDATIONS = (
+    "CRITICAL: Maintainability Index extremely low ({score:.1f}/100, {rating}). Immediate refactoring required - code is very difficult to maintain",
+    "URGENT: Maintainability Index in red zone ({score:.1f}/100, {rating}). Difficult to maintain - reduce complexity, add comments, improve structure",
+    "Maintainability Index in yellow zone ({score:.1f}/100, {rating}). Moderate maintainability - can be enhanced with refactoring",
+    "Good maintainability ({score:.1f}/100, Green zone), but can reach excellent with minor improvements",
+    None,
+)
 
 
 def generate_recommendations(eval_results: dict) -> list:
@@ -1049,6 +1439,11 @@ def generate_recommendations(eval_results: dict) -> list:
     Returns:
         list: Recommendations for improvement
     """
+    # Nothing past the syntax check ran, so the remaining checks would only
+    # react to missing metrics
+    if not eval_results.get('syntax_ok'):
+        return ["CRITICAL: Fix syntax errors before any other refactoring"]
+
     recommendations = []
 
     # Documentation & Code Clarity
@@ -1057,12 +1452,9 @@ def generate_recommendations(eval_results: dict) -> list:
     
     # Complexity & Maintainability
     avg_complexity = eval_results.get('avg_complexity', 0)
-    if avg_complexity > 15:
-        recommendations.append(f"Critical: Refactor highly complex functions (complexity {avg_complexity:.1f} > 15). Break into smaller, single-responsibility functions")
-    elif avg_complexity > 10:
-        recommendations.append(f"Refactor complex functions (complexity {avg_complexity:.1f} > 10) to improve readability and testability")
-    elif avg_complexity > 5:
-        recommendations.append(f"Consider simplifying moderately complex functions (complexity {avg_complexity:.1f}) for long-term maintainability")
+    template = COMPLEXITY_RECOMMENDATIONS[bisect.bisect_left(COMPLEXITY_THRESHOLDS, avg_complexity)]
+    if template:
+        recommendations.append(template.format(complexity=avg_complexity))
     
     # Security Analysis
     security = eval_results.get('security', {})
@@ -1076,21 +1468,23 @@ def generate_recommendations(eval_results: dict) -> list:
         recommendations.append(f"Address {medium_issues} medium/low severity security issue(s) to harden defenses")
     
     # Add security best practices
-    if total_issues == 0 and eval_results.get('syntax_ok'):
+    if total_issues == 0:
         # Recommend proactive security measures
         recommendations.append("Implement input sanitization and validation for all user-facing functions")
         recommendations.append("Add security headers and CSRF protection for web endpoints")
     
     # Error Handling & Resilience
     error_handling = eval_results.get('error_handling', {})
+    bare_except_count = error_handling.get('bare_except_count', 0)
+    has_validation = error_handling.get('has_validation')
     
     if not error_handling.get('has_try_except'):
         recommendations.append("Add comprehensive error handling with try-except blocks for all I/O operations and external calls")
     
-    if error_handling.get('bare_except_count', 0) > 0:
-        recommendations.append(f"Replace {error_handling['bare_except_count']} bare 'except:' clause(s) with specific exception types (ValueError, IOError, etc.)")
+    if bare_except_count > 0:
+        recommendations.append(f"Replace {bare_except_count} bare 'except:' clause(s) with specific exception types (ValueError, IOError, etc.)")
     
-    if not error_handling.get('has_validation'):
+    if not has_validation:
         recommendations.append("Add input validation with type checking and range validation to prevent runtime errors")
     
     if not error_handling.get('has_custom_exceptions'):
@@ -1103,8 +1497,9 @@ def generate_recommendations(eval_results: dict) -> list:
     tests = eval_results.get('test_coverage', {})
     test_count = tests.get('test_functions', 0)
     assertion_count = tests.get('assertion_count', 0)
+    has_tests = tests.get('has_tests')
     
-    if not tests.get('has_tests'):
+    if not has_tests:
         recommendations.append("Add comprehensive unit tests with pytest or unittest framework - aim for 80%+ code coverage")
     elif test_count < 3:
         recommendations.append(f"Expand test suite beyond {test_count} test(s) - add edge cases, error scenarios, and integration tests")
@@ -1116,16 +1511,10 @@ def generate_recommendations(eval_results: dict) -> list:
     mi = eval_results.get('maintainability', {})
     mi_score = mi.get('maintainability_index', 0)
     mi_rating = mi.get('rating', 'Unknown')
-    mi_color = mi.get('color', 'Unknown')
-    
-    if mi_score < 20:
-        recommendations.append(f"CRITICAL: Maintainability Index extremely low ({mi_score:.1f}/100, {mi_rating}). Immediate refactoring required - code is very difficult to maintain")
-    elif mi_score < 60:
-        recommendations.append(f"URGENT: Maintainability Index in red zone ({mi_score:.1f}/100, {mi_rating}). Difficult to maintain - reduce complexity, add comments, improve structure")
-    elif mi_score < 80:
-        recommendations.append(f"Maintainability Index in yellow zone ({mi_score:.1f}/100, {mi_rating}). Moderate maintainability - can be enhanced with refactoring")
-    elif mi_score < 90:
-        recommendations.append(f"Good maintainability ({mi_score:.1f}/100, Green zone), but can reach excellent with minor improvements")
+
+    template = MAINTAINABILITY_RECOMMENDATIONS[bisect.bisect_right(MAINTAINABILITY_THRESHOLDS, mi_score)]
+    if template:
+        recommendations.append(template.format(score=mi_score, rating=mi_rating))
     
     # SOLID Principles
     solid = eval_results.get('solid_principles', {})
@@ -1134,41 +1523,72 @@ def generate_recommendations(eval_results: dict) -> list:
     avg_methods = solid.get('avg_methods_per_class', 0)
     
     if god_classes:
-        recommendations.append(f"Refactor God classe(s) {', '.join(god_classes)} - violates Single Responsibility Principle. Split into focused classes")
+        recommendations.append(f"Refactor God classe(s) {_fmt_list(god_classes)} - violates Single Responsibility Principle. Split into focused classes")
     
     if long_methods:
-        recommendations.append(f"Break down long method(s) {', '.join(long_methods[:3])} (>50 lines) into smaller functions")
+        recommendations.append(f"Break down long method(s) {_fmt_list(long_methods, limit=3)} (>50 lines) into smaller functions")
     
     if avg_methods > 10:
         recommendations.append(f"Classes average {avg_methods:.1f} methods - consider extracting related methods into separate classes or modules")
     
     # Dynamic Code Analysis Recommendations (Checkpoint principles)
-    if eval_results.get('syntax_ok'):
-        # Runtime behavior recommendations
-        recommendations.append("Consider adding runtime assertions and invariant checks for dynamic behavior validation")
-        recommendations.append("Implement code profiling to identify performance bottlenecks during execution")
-        recommendations.append("Add memory usage monitoring for resource-intensive operations")
-        
-        # Code quality patterns
-        if not error_handling.get('has_validation'):
-            recommendations.append("Use defensive programming: validate inputs at function boundaries to fail fast")
-        
-        if eval_results.get('functions', 0) > 5 and not tests.get('has_tests'):
-            recommendations.append("Add integration tests to verify component interactions and data flow")
-        
-        # Modern best practices
-        recommendations.append("Use type hints (PEP 484) for better IDE support and static analysis")
-        recommendations.append("Consider using linters (pylint, flake8) and formatters (black) for consistent code style")
-        recommendations.append("Add pre-commit hooks to enforce quality checks before code commits")
+    # Runtime behavior recommendations
+    recommendations.append("Consider adding runtime assertions and invariant checks for dynamic behavior validation")
+    recommendations.append("Implement code profiling to identify performance bottlenecks during execution")
+    recommendations.append("Add memory usage monitoring for resource-intensive operations")
+    
+    # Code quality patterns
+    if not has_validation:
+        recommendations.append("Use defensive programming: validate inputs at function boundaries to fail fast")
+    
+    if eval_results.get('functions', 0) > 5 and not has_tests:
+        recommendations.append("Add integration tests to verify component interactions and data flow")
     
+    # Modern best practices
+    recommendations.append("Use type hints (PEP 484) for better IDE support and static analysis")
+    recommendations.append("Consider using linters (pylint, flake8) and formatters (black) for consistent code style")
+    recommendations.append("Add pre-commit hooks to enforce quality checks before code commits")
+
     return recommendations
 
 
 
 
-def apply_recommendations_once(original_prompt: str, code: str, eval_results: dict, recommendations: list) -> tuple:
+def evaluate_bundle(code: str) -> tuple:
+    """
+    Evaluate code, score it and build its recommendations in one call.
+
+    Returns: (eval_results, production_score, recommendations)
+    """
+    eval_results = evaluate_code(code)
+    return eval_results, calculate_production_score(eval_results), generate_recommendations(eval_results)
+
+
+
+
+APPLY_RECOMMENDATIONS_SCORE_THRESHOLD = 85  # below this the extra LLM round-trip is worth it
+HIGH_VALUE_RECOMMENDATION_MARKERS = ("CRITICAL", "URGENT", "high-severity")
+
+
+def should_apply_recommendations(prod_score: dict, recommendations: list) -> bool:
+    """
+    Decide whether an apply-recommendations LLM call is worth its round-trip.
+
+    Already-good code is only sent back when a recommendation is critical,
+    urgent or about a high-severity security issue.
+    """
+    if not recommendations:
+        return False
+    if prod_score['total_score'] < APPLY_RECOMMENDATIONS_SCORE_THRESHOLD:
+        return True
+    return any(marker in rec for rec in recommendations for marker in HIGH_VALUE_RECOMMENDATION_MARKERS)
+
+
+def apply_recommendations_once(original_prompt: str, code: str, eval_results: dict, recommendations: list,
+                               prod_score: dict = None) -> tuple:
     """
     Ask the LLM to apply the provided recommendations once and return the resulting code and its evaluation.
+    Pass prod_score when the production score of eval_results is already known.
 
     Returns: (new_code, new_eval_results)
     """
@@ -1180,25 +1600,19 @@ def apply_recommendations_once(original_prompt: str, code: str, eval_results: di
         return code, eval_results
 
     print("\nApplying end-of-report recommendations to the initial Groq code...")
-    improvement_prompt = build_improvement_prompt(original_prompt, code, eval_results, recommendations)
+    improvement_prompt = build_improvement_prompt(original_prompt, code, eval_results, recommendations, prod_score)
 
     try:
-        response = client.chat.completions.create(
+        new_code = _complete_code(
             model="llama-3.3-70b-versatile",
             messages=[
-                {"role": "system", "content": "You are an expert Python developer focused on improving code quality. Apply the listed recommendations to the provided code and return ONLY the complete improved Python code without any explanation or markdown."},
+                {"role": "system", "content": APPLY_RECOMMENDATIONS_SYSTEM_PROMPT},
                 {"role": "user", "content": improvement_prompt},
             ],
             temperature=0.5,
             max_tokens=4096,
         )
 
-        new_code = response.choices[0].message.content
-        if "```python" in new_code:
-            new_code = new_code.split("```python")[1].split("```")[0].strip()
-        elif "```" in new_code:
-            new_code = new_code.split("```")[1].split("```")[0].strip()
-
         new_eval = evaluate_code(new_code)
         return new_code, new_eval
 
@@ -1210,7 +1624,8 @@ def apply_recommendations_once(original_prompt: str, code: str, eval_results: di
 
 
 
-def report_results(prompt: str, code: str, eval_results: dict, improvement_history: list = None):
+def report_results(prompt: str, code: str, eval_results: dict, improvement_history: list = None,
+                   recommendations: list = None, prod_score: dict = None):
     """
     Generate and display comprehensive quality report.
 
@@ -1219,110 +1634,111 @@ def report_results(prompt: str, code: str, eval_results: dict, improvement_histo
         code (str): Final generated code
         eval_results (dict): Code evaluation results
         improvement_history (list): Iteration history
+        recommendations (list): Recommendations for eval_results, generated if omitted
+        prod_score (dict): Production score of eval_results, calculated if omitted
     """
-    print("\n" + "="*60)
-    print("CODE GENERATION & QUALITY REPORT")
-    print("="*60)
-    print(f"\nPrompt:\n{prompt}\n")
+    # Collect the report and write it out in one go instead of one print() per line
+    lines = []
+    lines.append("\n" + "="*60)
+    lines.append("CODE GENERATION & QUALITY REPORT")
+    lines.append("="*60)
+    lines.append(f"\nPrompt:\n{prompt}\n")
 
     # Show improvement progression if available
     if improvement_history and len(improvement_history) > 1:
-        print("-"*60)
-        print("IMPROVEMENT PROGRESSION:")
-        print("-"*60)
+        lines.append("-"*60)
+        lines.append("IMPROVEMENT PROGRESSION:")
+        lines.append("-"*60)
         for entry in improvement_history:
-            print(f"   Iteration {entry['iteration']}: {entry['score']}/100 ({entry['rating']})")
-        print()
+            lines.append(f"   Iteration {entry['iteration']}: {entry['score']}/100 ({entry['rating']})")
+        lines.append("")
 
-    print("-"*60)
-    print("FINAL GENERATED CODE:")
-    print("-"*60)
-    print(code)
-    print()
+    lines.append("-"*60)
+    lines.append("FINAL GENERATED CODE:")
+    lines.append("-"*60)
+    lines.append(code)
+    lines.append("")
 
     # Production Score
-    prod_score = calculate_production_score(eval_results)
-    print("="*60)
-    print(f"PRODUCTION READINESS SCORE: {prod_score['total_score']}/{prod_score['max_score']} ({prod_score['percentage']}%)")
-    print(f"   Rating: {prod_score['rating']}")
-    print("="*60)
-
-    print("\nSCORE BREAKDOWN:")
-    for category, points in prod_score['breakdown'].items():
-        max_points = {"syntax": 20, "documentation": 15, "complexity": 15,
-                     "security": 20, "error_handling": 10, "tests": 10,
-                     "maintainability": 10}.get(category, 10)
-        print(f"   • {category.title()}: {points}/{max_points}")
+    if prod_score is None:
+        prod_score = calculate_production_score(eval_results)
+    lines.append("="*60)
+    lines.append(f"PRODUCTION READINESS SCORE: {prod_score['total_score']}/{prod_score['max_score']} ({prod_score['percentage']}%)")
+    lines.append(f"   Rating: {prod_score['rating']}")
+    lines.append("="*60)
+
+    model = _build_report_model(eval_results, prod_score)
+    lines.append("\nSCORE BREAKDOWN:")
+    for label, points, max_points, _ in model['breakdown_rows']:
+        lines.append(f"   • {label}: {points}/{max_points}")
 
     # Basic Metrics
-    print("\nBASIC METRICS:")
-    print(f"   • Syntax Valid: {'Yes' if eval_results['syntax_ok'] else 'No'}")
-    print(f"   • Functions: {eval_results.get('functions', 0)}")
-    print(f"   • Avg Complexity: {eval_results.get('avg_complexity', 0)}")
-    print(f"   • Has Docstrings: {'Yes' if eval_results.get('has_docstrings') else 'No'}")
+    lines.append("\nBASIC METRICS:")
+    lines.append(f"   • Syntax Valid: {model['syntax_ok']}")
+    lines.append(f"   • Functions: {model['functions']}")
+    lines.append(f"   • Avg Complexity: {model['avg_complexity']}")
+    lines.append(f"   • Has Docstrings: {model['has_docstrings']}")
 
     # Maintainability
     if 'maintainability' in eval_results:
-        mi = eval_results['maintainability']
-        print(f"\nMAINTAINABILITY INDEX:")
-        print(f"   • Score: {mi.get('maintainability_index', 0)} - {mi.get('rating', 'N/A')}")
-        print(f"   • Halstead Volume: {mi.get('halstead_volume', 0):.2f}")
-        print(f"   • Logical LOC: {mi.get('lloc', 0)}")
+        lines.append(f"\nMAINTAINABILITY INDEX:")
+        lines.append(f"   • Score: {model['mi_index']} - {model['mi_rating']}")
+        lines.append(f"   • Halstead Volume: {model['halstead_volume']}")
+        lines.append(f"   • Logical LOC: {model['lloc']}")
 
     # Security
     if 'security' in eval_results:
-        sec = eval_results['security']
-        print(f"\nSECURITY ANALYSIS:")
-        if 'error' in sec:
-            print(f"   Warning: {sec['error']}")
+        lines.append(f"\nSECURITY ANALYSIS:")
+        if model['security_error'] is not None:
+            lines.append(f"   Warning: {model['security_error']}")
         else:
-            print(f"   • Total Issues: {sec.get('security_issues', 0)}")
-            print(f"   • High Severity: {sec.get('high_severity', 0)}")
-            if sec.get('issues'):
-                print(f"   • Top Issues:")
-                for issue in sec['issues'][:3]:
-                    print(f"     - Line {issue['line']}: {issue['issue']} [{issue['severity']}]")
+            lines.append(f"   • Total Issues: {model['security_issues']}")
+            lines.append(f"   • High Severity: {model['high_severity']}")
+            if model['top_issues']:
+                lines.append(f"   • Top Issues:")
+                for issue in model['top_issues'][:3]:
+                    lines.append(f"     - {issue}")
 
     # Error Handling
     if 'error_handling' in eval_results:
-        err = eval_results['error_handling']
-        print(f"\nERROR HANDLING:")
-        print(f"   • Try-Except Blocks: {err.get('exception_count', 0)}")
-        print(f"   • Bare Except: {err.get('bare_except_count', 0)} {'(avoid!)' if err.get('bare_except_count', 0) > 0 else ''}")
-        print(f"   • Has Logging: {'Yes' if err.get('has_logging') else 'No'}")
-        print(f"   • Input Validation: {'Yes' if err.get('has_validation') else 'No'}")
+        lines.append(f"\nERROR HANDLING:")
+        lines.append(f"   • Try-Except Blocks: {model['exception_count']}")
+        lines.append(f"   • Bare Except: {model['bare_except_count']} {'(avoid!)' if model['bare_except_count'] > 0 else ''}")
+        lines.append(f"   • Has Logging: {model['has_logging']}")
+        lines.append(f"   • Input Validation: {model['has_validation']}")
 
     # Tests
     if 'test_coverage' in eval_results:
-        tests = eval_results['test_coverage']
-        print(f"\nTEST COVERAGE:")
-        print(f"   • Has Tests: {'Yes' if tests.get('has_tests') else 'No'}")
-        print(f"   • Test Functions: {tests.get('test_functions', 0)}")
-        print(f"   • Assertions: {tests.get('assertion_count', 0)}")
-        if tests.get('test_frameworks'):
-            print(f"   • Frameworks: {', '.join(tests['test_frameworks'])}")
+        lines.append(f"\nTEST COVERAGE:")
+        lines.append(f"   • Has Tests: {model['has_tests']}")
+        lines.append(f"   • Test Functions: {model['test_functions']}")
+        lines.append(f"   • Assertions: {model['assertion_count']}")
+        if model['test_frameworks']:
+            lines.append(f"   • Frameworks: {model['test_frameworks']}")
 
     # SOLID Principles
     if 'solid_principles' in eval_results:
-        solid = eval_results['solid_principles']
-        print(f"\nSOLID PRINCIPLES:")
-        print(f"   • SRP Score: {solid.get('srp_score', 0):.1f}/100")
-        print(f"   • Classes: {solid.get('class_count', 0)}")
-        if solid.get('god_classes'):
-            print(f"   • God Classes (>10 methods): {', '.join(solid['god_classes'])}")
-        if solid.get('long_methods'):
-            print(f"   • Long Methods (>50 lines): {', '.join(solid['long_methods'])}")
-
-    recommendations = generate_recommendations(eval_results)
-    print("\nRECOMMENDATIONS:")
+        lines.append(f"\nSOLID PRINCIPLES:")
+        lines.append(f"   • SRP Score: {model['srp_score']}/100")
+        lines.append(f"   • Classes: {model['class_count']}")
+        if model['god_classes']:
+            lines.append(f"   • God Classes (>10 methods): {model['god_classes']}")
+        if model['long_methods']:
+            lines.append(f"   • Long Methods (>50 lines): {model['long_methods']}")
+
+    if recommendations is None:
+        recommendations = generate_recommendations(eval_results)
+    lines.append("\nRECOMMENDATIONS:")
 
     if recommendations:
         for i, rec in enumerate(recommendations, 1):
-            print(f"   {i}. {rec}")
+            lines.append(f"   {i}. {rec}")
     else:
-        print("   Code looks good! Consider peer review before deployment.")
+        lines.append("   Code looks good! Consider peer review before deployment.")
 
-    print("\n" + "="*60)
+    lines.append("\n" + "="*60)
+
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 
@@ -1345,9 +1761,19 @@ def get_multiline_input(prompt: str) -> str:
     lines = []
     empty_line_count = 0
 
+    # Piped input skips input()'s prompt/readline machinery. Read line by line
+    # rather than slurping stdin so the later save prompts still get their answers.
+    interactive = sys.stdin.isatty()
+
     while True:
         try:
-            line = input()
+            if interactive:
+                line = input()
+            else:
+                line = sys.stdin.readline()
+                if not line:
+                    break
+                line = line.rstrip('\n')
 
             if line.strip().upper() == 'END':
                 break
@@ -1374,6 +1800,9 @@ def get_multiline_input(prompt: str) -> str:
 
 
 if __name__ == "__main__":
+    # Progress from generation and refinement goes through logging; show it on the console
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     print("AI Code Quality Evaluator with Auto-Refinement (Powered by Groq)")
     print("="*60)
     print("This tool generates Python code from your description,")
@@ -1405,46 +1834,54 @@ if __name__ == "__main__":
     print("-"*60)
     print(initial_groq_code)
 
+    start_score = initial_score
     recs = generate_recommendations(eval_results)
     if recs:
         print("\nRecommendations detected from initial evaluation:")
         for i, r in enumerate(recs, 1):
             print(f"   {i}. {r}")
 
-        rec_code, rec_eval = apply_recommendations_once(user_prompt, generated_code, eval_results, recs)
+    if should_apply_recommendations(initial_score, recs):
+        rec_code, rec_eval = apply_recommendations_once(user_prompt, generated_code, eval_results, recs, initial_score)
         rec_score = calculate_production_score(rec_eval)
 
         if rec_score['total_score'] > initial_score['total_score']:
             print(f"\nApplying recommendations improved score: {initial_score['total_score']} -> {rec_score['total_score']}")
             generated_code = rec_code
             eval_results = rec_eval
+            start_score = rec_score
         else:
             print(f"\nApplying recommendations did not improve the score ({initial_score['total_score']} -> {rec_score['total_score']}). Keeping initial Groq output as starting point.")
+    elif recs:
+        print(f"\nInitial score {initial_score['total_score']} is already high and no recommendation is critical. Skipping the recommendation pass.")
 
     print("\nStarting automatic refinement process...")
     print("   (This will refine the code intelligently until production-ready or convergence)")
 
-    generated_code, eval_results, iterations, improvement_history = refine_code_automatic(
+    generated_code, eval_results, final_score, recs, iterations, improvement_history = refine_code_automatic(
         user_prompt,
         generated_code,
-        eval_results
+        eval_results,
+        start_score
     )
 
     print(f"\nRefinement complete after {iterations} iteration(s)")
 
-    report_results(user_prompt, generated_code, eval_results, improvement_history)
+    report_results(user_prompt, generated_code, eval_results, improvement_history, recs, final_score)
 
     # print("\nGenerating documentation...")
-    # documentation = generate_documentation(user_prompt, generated_code, eval_results, improvement_history)
+    # documentation = generate_documentation(user_prompt, generated_code, eval_results, improvement_history, recs, final_score)
 
     save = input("\nSave results? (y/n): ").strip().lower()
     if save == 'y':
         # Save code
         code_filename = input("Enter code filename (default: generated_code.py): ").strip() or "generated_code.py"
-        with open(code_filename, 'w') as f:
-            f.write(f"# Auto-generated and refined code\n")
-            f.write(f"# Original prompt: {user_prompt[:100]}...\n")
-            f.write(f"# Production score: {calculate_production_score(eval_results)['total_score']}/100\n\n")
+        with open(code_filename, 'w', buffering=1 << 16) as f:
+            f.writelines((
+                "# Auto-generated and refined code\n",
+                f"# Original prompt: {user_prompt[:100]}...\n",
+                f"# Production score: {final_score['total_score']}/100\n\n",
+            ))
             f.write(generated_code)
         print(f"Code saved to {code_filename}")
 
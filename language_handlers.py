@@ -16,18 +16,187 @@ External Dependencies:
 See CREDITS.md for full attribution.
 """
 
+import io
 import os
+import asyncio
+import functools
 import re
 import tempfile
 import subprocess
-import json
-from groq import Groq
+try:
+    import orjson as json
+except ImportError:
+    import json
+import hashlib
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import ParseError, iterparse
+from diskcache import Cache
+from groq import APIStatusError, Groq
 from dotenv import load_dotenv
 
+from llm_utils import extract_fenced, http_client
+
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+# _groq_call_with_retry is the only retry policy; the SDK's own retries would multiply its attempts
+client = Groq(api_key=GROQ_API_KEY, http_client=http_client, max_retries=0) if GROQ_API_KEY else None
+
+log = logging.getLogger(__name__)
+
+# LLM analyses and generated code, persisted across restarts. Bump the
+# version whenever the model or the prompts change.
+LLM_CACHE_VERSION = "groq-v1"
+_llm_cache = Cache(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llmc"))
+
+
+def _llm_cache_key(kind: str, language: str, text: str) -> tuple:
+    digest = hashlib.blake2b(f"{language}\0{text}".encode(), digest_size=16).hexdigest()
+    return (LLM_CACHE_VERSION, kind, digest)
+
+
+# Backoff for rate-limited (429) or overloaded (503) Groq calls
+LLM_MAX_RETRIES = 4
+LLM_RETRY_DELAY = 30  # seconds before the first retry
+LLM_RETRY_BACKOFF = 1.5
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+def _groq_call_with_retry(fn, *args, **kwargs):
+    """Call a Groq client method, backing off exponentially on 429/503 responses."""
+    delay = LLM_RETRY_DELAY
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return fn(*args, **kwargs)
+        except APIStatusError as e:
+            if e.status_code not in RETRYABLE_STATUS_CODES or attempt == LLM_MAX_RETRIES:
+                raise
+            log.warning("Groq returned %s, retrying in %.0fs (attempt %d/%d)",
+                        e.status_code, delay, attempt + 1, LLM_MAX_RETRIES)
+            time.sleep(delay)
+            delay *= LLM_RETRY_BACKOFF
+
+
+def _log_usage(usage) -> None:
+    """Log prompt tokens and how many of them Groq served from its prompt cache."""
+    if usage is None:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) or 0
+    log.debug("Groq usage: %s prompt tokens (%s cached), %s completion tokens",
+              usage.prompt_tokens, cached, usage.completion_tokens)
+
+
+def _stream_text(stream, is_complete) -> str:
+    """
+    Collect a streamed completion's text, closing the stream as soon as
+    is_complete(delta, parts) reports the useful part has arrived.
+
+    Usage is only reported on the final chunk, so it is logged only for
+    streams that run to the end.
+    """
+    parts = []
+    try:
+        for chunk in stream:
+            x_groq = getattr(chunk, 'x_groq', None)
+            if x_groq is not None:
+                _log_usage(getattr(x_groq, 'usage', None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            if is_complete(delta, parts):
+                break
+    finally:
+        stream.close()
+    return "".join(parts)
+
+
+class _JsonEndScanner:
+    """Tracks bracket depth across streamed deltas, skipping brackets inside JSON strings.
+
+    Depth is only counted from the payload onwards: just after the first ``` fence, or from the
+    reply's first non-whitespace character when that is a bracket. Brackets in a prose preamble
+    ("Here is the analysis [JSON]:") are ignored.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.payload = False
+
+    def _payload_start(self, text: str):
+        stripped = text.lstrip()
+        if stripped[:1] in ('{', '['):
+            return len(text) - len(stripped)
+        fence = text.find('```')
+        if fence == -1:
+            return None
+        end = fence + 3
+        while end < len(text) and text[end].isalpha():
+            end += 1
+        return end if end < len(text) else None  # the language tag may still be streaming
+
+    def _scan(self, chunk: str) -> int:
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+                self.started = True
+            elif ch in '}]':
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    return i
+        return -1
+
+    def __call__(self, delta: str, parts: list) -> bool:
+        if self.payload:
+            end = self._scan(delta)
+            if end == -1:
+                return False
+            parts[-1] = delta[:end + 1]  # drop whatever followed the closing bracket
+            return True
+        text = ''.join(parts)
+        start = self._payload_start(text)
+        if start is None:
+            return False
+        self.payload = True
+        end = self._scan(text[start:])
+        if end == -1:
+            return False
+        parts[:] = [text[:start + end + 1]]
+        return True
+
+
+def _fence_closed(marker: str):
+    """Completion check that stops once a ```marker (or bare ```) block has closed."""
+    opening = f"```{marker}"
+
+    def is_complete(delta: str, parts: list) -> bool:
+        if "`" not in delta:
+            return False
+        text = "".join(parts)
+        start = text.find(opening)
+        if start < 0:
+            start = text.find("```")
+        return start >= 0 and text.find("```", start + 3) >= 0
+
+    return is_complete
 
 
 LANGUAGE_EXTENSIONS = {
@@ -44,48 +213,135 @@ LANGUAGE_EXTENSIONS = {
     'php': ['.php'],
 }
 
+# Extension lookup table, built in reverse so that an extension listed
+# twice ('.h') keeps the first language, as the old linear scan did
+EXT_TO_LANG = {
+    ext: lang for lang, extensions in reversed(LANGUAGE_EXTENSIONS.items()) for ext in extensions
+}
+
+
+# Detection and analysis patterns, compiled once at import instead of going
+# through the bounded re cache on every call
+_RE_PY = re.compile(r'^(def|class|import|from)\s+', re.MULTILINE)
+_RE_JAVA = re.compile(r'^(public|private|protected)\s+(class|interface|enum)', re.MULTILINE)
+_RE_C_INCLUDE = re.compile(r'#include\s+<')
+_RE_JS = re.compile(r'^(function|const|let|var|class)\s+', re.MULTILINE)
+_RE_GO = re.compile(r'^package\s+main|^func\s+', re.MULTILINE)
+_RE_RUST = re.compile(r'^(fn|pub|struct|impl)\s+', re.MULTILINE)
+_RE_CSHARP = re.compile(r'^namespace\s+|using\s+System', re.MULTILINE)
+
+# cppcheck ids that count as security (memory-safety) issues
+_CPPCHECK_SECURITY_IDS = ('buffer', 'memory', 'null', 'leak')
+
+_RE_JAVA_CLASS = re.compile(r'\b(public|private|protected)?\s*class\s+\w+')
+_RE_JAVA_METHOD = re.compile(r'\b(public|private|protected|static)\s+\w+\s+\w+\s*\([^)]*\)')
+_RE_JAVA_MAIN = re.compile(r'public\s+static\s+void\s+main\s*\(')
+_RE_JAVA_JAVADOC = re.compile(r'/\*\*[^*]*\*+([^/*][^*]*\*+)*/')
+_RE_JAVA_IMPORT = re.compile(r'^import\s+', re.MULTILINE)
+_RE_JAVA_CLASSDEF = re.compile(r'class\s+\w+')
+_RE_JAVA_SYSOUT = re.compile(r'System\.out\.print')
+_RE_JAVA_EMPTY_CATCH = re.compile(r'catch\s*\(\s*Exception\s+\w+\s*\)\s*\{?\s*\}')
+_RE_JAVA_PACKAGE = re.compile(r'package\s+')
+
 
 def detect_language(code: str, filename: str = None) -> str:
     """
     Detect programming language from code content or filename.
     """
     if filename:
-        ext = os.path.splitext(filename)[1].lower()
-        for lang, extensions in LANGUAGE_EXTENSIONS.items():
-            if ext in extensions:
-                return lang
+        lang = EXT_TO_LANG.get(os.path.splitext(filename)[1].lower())
+        if lang:
+            return lang
     
     # Content-based detection
-    if re.search(r'^(def|class|import|from)\s+', code, re.MULTILINE):
+    if _RE_PY.search(code):
         return 'python'
-    elif re.search(r'^(public|private|protected)\s+(class|interface|enum)', code, re.MULTILINE):
+    elif _RE_JAVA.search(code):
         return 'java'
-    elif re.search(r'#include\s+<', code):
+    elif _RE_C_INCLUDE.search(code):
         if '.cpp' in (filename or '') or 'namespace' in code or 'class' in code:
             return 'cpp'
         return 'c'
-    elif re.search(r'^(function|const|let|var|class)\s+', code, re.MULTILINE):
+    elif _RE_JS.search(code):
         if 'interface' in code or ': string' in code or ': number' in code:
             return 'typescript'
         return 'javascript'
-    elif re.search(r'^package\s+main|^func\s+', code, re.MULTILINE):
+    elif _RE_GO.search(code):
         return 'go'
-    elif re.search(r'^(fn|pub|struct|impl)\s+', code, re.MULTILINE):
+    elif _RE_RUST.search(code):
         return 'rust'
-    elif re.search(r'^namespace\s+|using\s+System', code, re.MULTILINE):
+    elif _RE_CSHARP.search(code):
         return 'csharp'
     
     return 'unknown'
 
 
-def analyze_c_cpp_code(code: str, language: str = 'cpp') -> dict:
+def _count_cppcheck_issues(xml_source, result: dict) -> None:
     """
-    Analyze C/C++ code using cppcheck static analyzer.
-    
-    Cppcheck: GPL-3.0 License
-    See: http://cppcheck.sourceforge.net/
+    Fill in result's issue lists and counts from cppcheck --xml-version=2 output.
+
+    xml_source is a binary file object, such as cppcheck's stderr pipe.
+    Streams the report through the C expat parser, clearing each <error>
+    element once counted. Issues read before truncated or malformed output
+    are kept.
     """
-    result = {
+    errors, warnings = [], []
+    security = style = performance = 0
+    try:
+        for _, elem in iterparse(xml_source, events=('end',)):
+            if elem.tag != 'error':
+                continue
+            severity = elem.get('severity')
+            if severity == 'style':
+                style += 1
+            elif severity == 'performance':
+                performance += 1
+            elif severity in ('error', 'warning'):
+                msg = elem.get('msg')
+                if msg is not None:
+                    (errors if severity == 'error' else warnings).append(msg)
+                if elem.get('id', '').startswith(_CPPCHECK_SECURITY_IDS):
+                    security += 1
+            elem.clear()
+    except ParseError:
+        pass
+
+    result['errors'] = errors
+    result['warnings'] = warnings
+    result['security_issues'] = security
+    result['style_issues'] = style
+    result['performance_issues'] = performance
+
+
+CPPCHECK_TIMEOUT = 30
+# cppcheck --enable=all is CPU-bound, so concurrent analyses are capped at one process per core
+CPPCHECK_MAX_PROCESSES = os.cpu_count() or 2
+_cppcheck_slots = threading.BoundedSemaphore(CPPCHECK_MAX_PROCESSES)
+
+
+def _reset_cppcheck_slots():
+    # Slots held by other threads at fork time would never be released in the child
+    global _cppcheck_slots
+    _cppcheck_slots = threading.BoundedSemaphore(CPPCHECK_MAX_PROCESSES)
+
+
+os.register_at_fork(after_in_child=_reset_cppcheck_slots)
+CPPCHECK_MISSING = 'cppcheck not installed. Install: brew install cppcheck (macOS) or apt-get install cppcheck (Linux)'
+
+
+@functools.lru_cache(maxsize=1)
+def _cppcheck_available() -> bool:
+    """Probe for the cppcheck binary once per process instead of once per analysis."""
+    try:
+        subprocess.run(['cppcheck', '--version'],
+                       capture_output=True, check=True, timeout=5)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+        return False
+
+
+def _new_cpp_result(language: str) -> dict:
+    return {
         'syntax_ok': True,
         'language': language,
         'security_issues': 0,
@@ -96,57 +352,157 @@ def analyze_c_cpp_code(code: str, language: str = 'cpp') -> dict:
         'tool': 'cppcheck',
         'error': None
     }
+
+
+def _write_cpp_source(code: str, language: str) -> str:
+    """Write code to a temporary .c/.cpp file for cppcheck and return its path."""
+    suffix = '.cpp' if language == 'cpp' else '.c'
+    # Unbuffered writes on the raw fd instead of going through a text-mode file object;
+    # os.write may write less than asked, so keep going until everything is out
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        data = memoryview(code.encode())
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+    return path
+
+
+def _cppcheck_command(source_file: str) -> list:
+    return [
+        'cppcheck',
+        '--enable=all',
+        '--suppress=missingIncludeSystem',
+        '--xml',
+        '--xml-version=2',
+        source_file
+    ]
+
+
+def analyze_c_cpp_code(code: str, language: str = 'cpp') -> dict:
+    """
+    Analyze C/C++ code using cppcheck static analyzer.
+    
+    Cppcheck: GPL-3.0 License
+    See: http://cppcheck.sourceforge.net/
+    """
+    result = _new_cpp_result(language)
     
     try:
-        # Check if cppcheck is installed
-        try:
-            subprocess.run(['cppcheck', '--version'], 
-                         capture_output=True, check=True, timeout=5)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            result['error'] = 'cppcheck not installed. Install: brew install cppcheck (macOS) or apt-get install cppcheck (Linux)'
+        if not _cppcheck_available():
+            result['error'] = CPPCHECK_MISSING
             return result
         
-        # Create temporary file
-        suffix = '.cpp' if language == 'cpp' else '.c'
-        with tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False) as f:
-            f.write(code)
-            temp_file = f.name
+        temp_file = _write_cpp_source(code, language)
         
         try:
-            # Run cppcheck
-            cmd = [
-                'cppcheck',
-                '--enable=all',
-                '--suppress=missingIncludeSystem',
-                '--xml',
-                '--xml-version=2',
-                temp_file
-            ]
+            with _cppcheck_slots:
+                proc = subprocess.Popen(
+                    _cppcheck_command(temp_file),
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE
+                )
+                
+                # Parse the XML report (errors go to stderr) while cppcheck is still
+                # writing it, instead of buffering all of it first. The timer kills
+                # cppcheck on timeout, which ends the stream.
+                timed_out = threading.Event()
+                
+                def kill_on_timeout():
+                    timed_out.set()
+                    proc.kill()
+                
+                timer = threading.Timer(CPPCHECK_TIMEOUT, kill_on_timeout)
+                timer.start()
+                try:
+                    with proc.stderr:
+                        _count_cppcheck_issues(proc.stderr, result)
+                    proc.wait()
+                finally:
+                    timer.cancel()
+                    # Don't give the slot back while cppcheck is still running (e.g. the parse failed)
+                    if proc.poll() is None:
+                        proc.kill()
+                        proc.wait()
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(proc.args, CPPCHECK_TIMEOUT)
             
-            proc = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            result['syntax_ok'] = len(result['errors']) == 0
             
-            # Parse XML output (errors go to stderr)
-            output = proc.stderr
+        finally:
+            os.unlink(temp_file)
             
-            # Count issues by severity
-            result['errors'] = re.findall(r'severity="error"[^>]*msg="([^"]+)"', output)
-            result['warnings'] = re.findall(r'severity="warning"[^>]*msg="([^"]+)"', output)
-            result['security_issues'] = len(re.findall(r'severity="(error|warning)"[^>]*id="(buffer|memory|null|leak)', output))
-            result['style_issues'] = len(re.findall(r'severity="style"', output))
-            result['performance_issues'] = len(re.findall(r'severity="performance"', output))
+    except subprocess.TimeoutExpired:
+        result['error'] = f'Analysis timeout (>{CPPCHECK_TIMEOUT}s)'
+    except Exception as e:
+        result['error'] = f'Analysis failed: {str(e)}'
+    
+    return result
+
+
+async def _acquire_cppcheck_slot():
+    """
+    Wait for a cppcheck slot on a worker thread and return the semaphore it came from.
+
+    The blocking acquire is shielded: if the caller is cancelled while it waits,
+    the slot is handed back as soon as the thread gets it instead of leaking.
+    """
+    slots = _cppcheck_slots
+    acquire = asyncio.ensure_future(asyncio.to_thread(slots.acquire))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or slots.release())
+        raise
+    return slots
+
+
+async def analyze_c_cpp_code_async(code: str, language: str = 'cpp') -> dict:
+    """
+    Asyncio variant of analyze_c_cpp_code for use from async handlers.
+
+    Runs cppcheck with asyncio.create_subprocess_exec, so waiting on it does
+    not block the event loop. Returns the same result dict.
+    """
+    result = _new_cpp_result(language)
+    
+    try:
+        if not await asyncio.to_thread(_cppcheck_available):
+            result['error'] = CPPCHECK_MISSING
+            return result
+        
+        # Share the process cap with the sync analyzer. The source file is only
+        # written once a slot is held, so nothing needs cleaning up before that.
+        slots = await _acquire_cppcheck_slot()
+        temp_file = proc = None
+        try:
+            temp_file = _write_cpp_source(code, language)
+            proc = await asyncio.create_subprocess_exec(
+                *_cppcheck_command(temp_file),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout=CPPCHECK_TIMEOUT)
+            
+            _count_cppcheck_issues(io.BytesIO(stderr), result)
             
             result['syntax_ok'] = len(result['errors']) == 0
             
         finally:
-            os.unlink(temp_file)
+            # Runs on timeout and on cancellation too, so cppcheck never outlives its slot
+            if proc is not None and proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+            slots.release()
+            if temp_file is not None:
+                os.unlink(temp_file)
             
-    except subprocess.TimeoutExpired:
-        result['error'] = 'Analysis timeout (>30s)'
+    except asyncio.TimeoutError:
+        result['error'] = f'Analysis timeout (>{CPPCHECK_TIMEOUT}s)'
     except Exception as e:
         result['error'] = f'Analysis failed: {str(e)}'
     
@@ -173,33 +529,33 @@ def analyze_java_code(code: str) -> dict:
     
     try:
         # Count classes
-        result['classes'] = len(re.findall(r'\b(public|private|protected)?\s*class\s+\w+', code))
+        result['classes'] = len(_RE_JAVA_CLASS.findall(code))
         
         # Count methods
-        result['methods'] = len(re.findall(r'\b(public|private|protected|static)\s+\w+\s+\w+\s*\([^)]*\)', code))
+        result['methods'] = len(_RE_JAVA_METHOD.findall(code))
         
         # Check for main method
-        result['has_main'] = bool(re.search(r'public\s+static\s+void\s+main\s*\(', code))
+        result['has_main'] = bool(_RE_JAVA_MAIN.search(code))
         
         # Check for JavaDoc
-        result['has_javadoc'] = bool(re.search(r'/\*\*[^*]*\*+([^/*][^*]*\*+)*/', code))
+        result['has_javadoc'] = bool(_RE_JAVA_JAVADOC.search(code))
         
         # Count imports
-        result['imports'] = len(re.findall(r'^import\s+', code, re.MULTILINE))
+        result['imports'] = len(_RE_JAVA_IMPORT.findall(code))
         
         # Basic syntax check
-        if not re.search(r'class\s+\w+', code):
+        if not _RE_JAVA_CLASSDEF.search(code):
             result['syntax_ok'] = False
             result['potential_issues'].append('No class definition found')
         
         # Check for common issues
-        if re.search(r'System\.out\.print', code):
+        if _RE_JAVA_SYSOUT.search(code):
             result['potential_issues'].append('Uses System.out.print (prefer logging framework)')
         
-        if re.search(r'catch\s*\(\s*Exception\s+\w+\s*\)\s*\{?\s*\}', code):
+        if _RE_JAVA_EMPTY_CATCH.search(code):
             result['potential_issues'].append('Empty catch block found')
         
-        if not re.search(r'package\s+', code):
+        if not _RE_JAVA_PACKAGE.search(code):
             result['potential_issues'].append('No package declaration')
             
     except Exception as e:
@@ -208,6 +564,16 @@ def analyze_java_code(code: str) -> dict:
     return result
 
 
+LLM_ANALYSIS_FIELDS = """- syntax_ok: boolean (is syntax valid?)
+- complexity_estimate: string (low/medium/high)
+- security_concerns: list of potential security issues
+- style_issues: list of code style problems
+- best_practices: list of violated best practices
+- recommendations: list of improvement suggestions"""
+
+LLM_BATCH_SIZE = 8  # snippets per batched request, keeping the reply within max_tokens
+
+
 def analyze_with_llm(code: str, language: str) -> dict:
     """
     Use LLM to analyze code in languages without dedicated static analyzers.
@@ -220,14 +586,14 @@ def analyze_with_llm(code: str, language: str) -> dict:
             'error': 'GROQ_API_KEY not configured'
         }
     
+    key = _llm_cache_key('analysis', language, code)
+    cached = _llm_cache.get(key)
+    if cached is not None:
+        return cached
+    
     try:
         prompt = f"""Analyze this {language} code for quality and issues. Provide a JSON response with:
-- syntax_ok: boolean (is syntax valid?)
-- complexity_estimate: string (low/medium/high)
-- security_concerns: list of potential security issues
-- style_issues: list of code style problems
-- best_practices: list of violated best practices
-- recommendations: list of improvement suggestions
+{LLM_ANALYSIS_FIELDS}
 
 Code to analyze:
 ```{language}
@@ -236,7 +602,8 @@ Code to analyze:
 
 Respond ONLY with valid JSON, no markdown."""
 
-        response = client.chat.completions.create(
+        response = _groq_call_with_retry(
+            client.chat.completions.create,
             model="llama-3.3-70b-versatile",
             messages=[
                 {"role": "system", "content": f"You are an expert {language} code reviewer. Analyze code and respond with JSON only."},
@@ -244,20 +611,17 @@ Respond ONLY with valid JSON, no markdown."""
             ],
             temperature=0.3,
             max_tokens=2048,
+            stream=True,
         )
         
-        analysis_text = response.choices[0].message.content.strip()
-        
-        # Extract JSON from response
-        if '```json' in analysis_text:
-            analysis_text = analysis_text.split('```json')[1].split('```')[0].strip()
-        elif '```' in analysis_text:
-            analysis_text = analysis_text.split('```')[1].split('```')[0].strip()
+        # The reply is complete once its top-level JSON object closes
+        analysis_text = extract_fenced(_stream_text(response, _JsonEndScanner()).strip(), 'json')
         
         analysis = json.loads(analysis_text)
         analysis['language'] = language
         analysis['tool'] = 'llm_analysis'
         
+        _llm_cache.set(key, analysis)
         return analysis
         
     except json.JSONDecodeError:
@@ -277,6 +641,109 @@ Respond ONLY with valid JSON, no markdown."""
         }
 
 
+def _request_batch_analysis(batch: list):
+    """
+    Ask for one JSON array covering every (language, code) snippet in batch.
+
+    Returns the list of analysis dicts, or None when the reply is not an array
+    with one object per snippet.
+    """
+    snippets = "\n\n".join(
+        f"{i}. ```{language}\n{code}\n```" for i, (language, code) in enumerate(batch, 1)
+    )
+    prompt = f"""Analyze each numbered code snippet for quality and issues. Provide a JSON array with one object per snippet, in the same order, each with:
+{LLM_ANALYSIS_FIELDS}
+
+Snippets to analyze:
+{snippets}
+
+Respond ONLY with a valid JSON array of {len(batch)} objects, no markdown."""
+
+    response = _groq_call_with_retry(
+        client.chat.completions.create,
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {"role": "system", "content": "You are an expert code reviewer. Analyze code and respond with JSON only."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=2048 * len(batch),
+        stream=True,
+    )
+
+    try:
+        analyses = json.loads(extract_fenced(_stream_text(response, _JsonEndScanner()).strip(), 'json'))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(analyses, list) or len(analyses) != len(batch):
+        return None
+    if not all(isinstance(analysis, dict) for analysis in analyses):
+        return None
+    return analyses
+
+
+def analyze_with_llm_batch(items: list) -> list:
+    """
+    Analyze several (language, code) snippets, LLM_BATCH_SIZE per Groq request.
+
+    Returns one analyze_with_llm-style dict per item, in input order. Cached
+    snippets are not resent, and a batch whose reply doesn't parse falls back
+    to analyzing its snippets one at a time.
+    """
+    if not client:
+        return [analyze_with_llm(code, language) for language, code in items]
+    
+    results = [None] * len(items)
+    pending = []
+    for index, (language, code) in enumerate(items):
+        cached = _llm_cache.get(_llm_cache_key('analysis', language, code))
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.append(index)
+    
+    for start in range(0, len(pending), LLM_BATCH_SIZE):
+        batch = pending[start:start + LLM_BATCH_SIZE]
+        snippets = [items[index] for index in batch]
+        try:
+            analyses = _request_batch_analysis(snippets)
+        except Exception as e:
+            for index, (language, _) in zip(batch, snippets):
+                results[index] = {
+                    'syntax_ok': None,
+                    'language': language,
+                    'error': f'LLM analysis failed: {str(e)}',
+                    'tool': 'llm_analysis'
+                }
+            continue
+        
+        if analyses is None:
+            for index, (language, code) in zip(batch, snippets):
+                results[index] = analyze_with_llm(code, language)
+            continue
+        
+        for index, (language, code), analysis in zip(batch, snippets, analyses):
+            analysis['language'] = language
+            analysis['tool'] = 'llm_analysis'
+            _llm_cache.set(_llm_cache_key('analysis', language, code), analysis)
+            results[index] = analysis
+    
+    return results
+
+
+# LLM analyses run here so they can overlap with local static analysis
+_llm_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
+
+
+def _reset_llm_pool():
+    # A forked child inherits the pool's bookkeeping but not its threads
+    global _llm_pool
+    _llm_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
+
+
+os.register_at_fork(after_in_child=_reset_llm_pool)
+
+
 def analyze_code_multi_language(code: str, language: str = None, filename: str = None) -> dict:
     """
     Main entry point for multi-language code analysis.
@@ -306,11 +773,12 @@ def analyze_code_multi_language(code: str, language: str = None, filename: str =
         
     elif language == 'java':
         result['analyzer_used'] = 'basic_java + llm'
+        # The Groq round-trip runs in the background while the regex checks run here
+        llm_analysis = _llm_pool.submit(analyze_with_llm, code, 'java')
         basic_analysis = analyze_java_code(code)
-        llm_analysis = analyze_with_llm(code, 'java')
         result['analysis'] = {
             'basic': basic_analysis,
-            'llm': llm_analysis
+            'llm': llm_analysis.result()
         }
         
     else:
@@ -320,6 +788,64 @@ def analyze_code_multi_language(code: str, language: str = None, filename: str =
     return result
 
 
+# Generation settings per language, built once at import
+LANG_CONFIGS = {
+    'python': {
+        'expert': 'Python',
+        'practices': 'type hints, docstrings, error handling, unit tests',
+        'marker': 'python'
+    },
+    'java': {
+        'expert': 'Java',
+        'practices': 'JavaDoc, proper exception handling, JUnit tests, SOLID principles',
+        'marker': 'java'
+    },
+    'c': {
+        'expert': 'C',
+        'practices': 'proper memory management, error checking, header guards, documentation',
+        'marker': 'c'
+    },
+    'cpp': {
+        'expert': 'C++',
+        'practices': 'RAII, smart pointers, const correctness, proper destructors, modern C++ features',
+        'marker': 'cpp'
+    },
+    'javascript': {
+        'expert': 'JavaScript',
+        'practices': 'async/await, error handling, JSDoc comments, modern ES6+ syntax',
+        'marker': 'javascript'
+    },
+    'typescript': {
+        'expert': 'TypeScript',
+        'practices': 'strict types, interfaces, proper error handling, async/await',
+        'marker': 'typescript'
+    }
+}
+
+
+def _default_lang_config(language: str) -> dict:
+    return {
+        'expert': language,
+        'practices': 'best practices and clean code',
+        'marker': language
+    }
+
+
+GENERATION_SYSTEM_PROMPT = """You are an expert {expert} developer who writes production-ready code with:
+- {practices}
+- Security best practices
+- Clean, maintainable code structure
+- Comprehensive error handling
+
+Return ONLY the {language} code without markdown formatting or explanations."""
+
+
+@functools.lru_cache(maxsize=32)
+def _generation_system_prompt(language: str, expert: str, practices: str) -> str:
+    """Format a language's system prompt once and reuse it for every request."""
+    return GENERATION_SYSTEM_PROMPT.format(expert=expert, practices=practices, language=language)
+
+
 def generate_code_multi_language(prompt: str, language: str = 'python') -> str:
     """
     Generate code in specified language using LLM.
@@ -327,71 +853,34 @@ def generate_code_multi_language(prompt: str, language: str = 'python') -> str:
     if not client:
         return f"// API key not configured\n// Fallback {language} code"
     
-    lang_configs = {
-        'python': {
-            'expert': 'Python',
-            'practices': 'type hints, docstrings, error handling, unit tests',
-            'marker': 'python'
-        },
-        'java': {
-            'expert': 'Java',
-            'practices': 'JavaDoc, proper exception handling, JUnit tests, SOLID principles',
-            'marker': 'java'
-        },
-        'c': {
-            'expert': 'C',
-            'practices': 'proper memory management, error checking, header guards, documentation',
-            'marker': 'c'
-        },
-        'cpp': {
-            'expert': 'C++',
-            'practices': 'RAII, smart pointers, const correctness, proper destructors, modern C++ features',
-            'marker': 'cpp'
-        },
-        'javascript': {
-            'expert': 'JavaScript',
-            'practices': 'async/await, error handling, JSDoc comments, modern ES6+ syntax',
-            'marker': 'javascript'
-        },
-        'typescript': {
-            'expert': 'TypeScript',
-            'practices': 'strict types, interfaces, proper error handling, async/await',
-            'marker': 'typescript'
-        }
-    }
+    config = LANG_CONFIGS.get(language) or _default_lang_config(language)
     
-    config = lang_configs.get(language, {
-        'expert': language,
-        'practices': 'best practices and clean code',
-        'marker': language
-    })
+    key = _llm_cache_key('generation', language, prompt)
+    cached = _llm_cache.get(key)
+    if cached is not None:
+        return cached
     
     try:
-        response = client.chat.completions.create(
+        response = _groq_call_with_retry(
+            client.chat.completions.create,
             model="llama-3.3-70b-versatile",
             messages=[
-                {"role": "system", "content": f"""You are an expert {config['expert']} developer who writes production-ready code with:
-- {config['practices']}
-- Security best practices
-- Clean, maintainable code structure
-- Comprehensive error handling
-
-Return ONLY the {language} code without markdown formatting or explanations."""},
+                {"role": "system", "content": _generation_system_prompt(language, config['expert'], config['practices'])},
                 {"role": "user", "content": prompt},
             ],
             temperature=0.7,
             max_tokens=4096,
+            stream=True,
         )
         
-        code = response.choices[0].message.content
+        # Stop reading once a fenced block closes; anything after it is discarded anyway
+        marker = config['marker']
+        code = _stream_text(response, _fence_closed(marker))
         
         # Strip markdown code blocks
-        marker = config['marker']
-        if f"```{marker}" in code:
-            code = code.split(f"```{marker}")[1].split("```")[0].strip()
-        elif "```" in code:
-            code = code.split("```")[1].split("```")[0].strip()
+        code = extract_fenced(code, marker)
         
+        _llm_cache.set(key, code)
         return code
         
     except Exception as e:
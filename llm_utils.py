@@ -0,0 +1,37 @@
+"""
+Helpers shared by the Python and multi-language LLM pipelines
+
+External Dependencies:
+- httpx (BSD-3-Clause): https://www.python-httpx.org
+"""
+
+import httpx
+
+# Shared connection pool for every Groq request, so concurrent API requests reuse
+# keep-alive connections instead of paying a TLS handshake per LLM call
+http_client = httpx.Client(
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+)
+
+
+def extract_fenced(text: str, marker: str = "python") -> str:
+    """
+    Return the body of the first ```marker (or bare ```) block of an LLM
+    reply, or the text as-is if unfenced.
+
+    Slices between the fences found with str.find rather than splitting the
+    whole reply into lists. A fence the stream was cut off before closing
+    runs to the end of the text.
+    """
+    opening = f"```{marker}"
+    start = text.find(opening)
+    if start >= 0:
+        start += len(opening)
+    else:
+        start = text.find("```")
+        if start < 0:
+            return text
+        start += len("```")
+    end = text.find("```", start)
+    return (text[start:end] if end >= 0 else text[start:]).strip()
@@ -85,11 +85,12 @@ async function evaluateCodeFromAPI(code) {
   return await response.json();
 }
 
-async function improveCodeFromAPI(code, prompt = 'Improve this code', maxIterations = 3) {
+async function improveCodeFromAPI(code, prompt = 'Improve this code', maxIterations = 3, onProgress = null) {
   const response = await fetch(`${API_BASE_URL}/improve`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      'Accept': 'application/x-ndjson',
     },
     body: JSON.stringify({ 
       code, 
@@ -103,7 +104,39 @@ async function improveCodeFromAPI(code, prompt = 'Improve this code', maxIterati
     throw new Error(error.error || 'Failed to improve code');
   }
   
-  return await response.json();
+  // The API streams one JSON event per line; the final "result" event holds the full response
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+  
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const event = JSON.parse(line);
+    if (event.event === 'error') {
+      throw new Error(event.error || 'Failed to improve code');
+    }
+    if (event.event === 'result') {
+      result = event.result;
+    } else if (onProgress) {
+      onProgress(event);
+    }
+  };
+  
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer + decoder.decode());
+  
+  if (!result) {
+    throw new Error('Improvement stream ended without a result');
+  }
+  return result;
 }
 
 function calculateProductionScore(evalResults) {
@@ -687,7 +720,15 @@ def test_calculator():
     improveCodeBtn.disabled = true;
 
     try {
-      const response = await improveCodeFromAPI(code, 'Improve this code for production readiness', 3);
+      let startScore = 0;
+      const response = await improveCodeFromAPI(code, 'Improve this code for production readiness', 3, (event) => {
+        if (event.event === 'start') {
+          startScore = event.original_score.total_score;
+          progressDetails.innerHTML = `<span id="improvementIteration">Starting</span><span id="improvementScore">Score: ${startScore}</span>`;
+        } else if (event.event === 'iteration') {
+          progressDetails.innerHTML = `<span id="improvementIteration">Iteration ${event.iteration}</span><span id="improvementScore">Score: ${startScore} → ${event.score}</span>`;
+        }
+      });
       
       if (response.success) {
         improvementProgress.classList.add('hidden');
@@ -19,25 +19,28 @@ def analyze_code_simple(code: str) -> str:
     }
 
     try:
-        result["line_count"] = len(code.splitlines())
-        result["comment_count"] = sum(1 for l in code.splitlines() if l.strip().startswith("#"))
+        lines = code.splitlines()
+        result["line_count"] = len(lines)
+        result["comment_count"] = sum(1 for l in lines if l.lstrip().startswith("#"))
 
         tree = ast.parse(code)
         result["syntax_ok"] = True
 
-        funcs = [n for n in ast.walk(tree) if isinstance(n, ast.FunctionDef)]
-        classes = [n for n in ast.walk(tree) if isinstance(n, ast.ClassDef)]
-        result["functions"] = len(funcs)
-        result["classes"] = len(classes)
-
-        has_docs = False
-        if ast.get_docstring(tree):
-            has_docs = True
-        else:
-            for f in funcs + classes:
-                if ast.get_docstring(f):
-                    has_docs = True
-                    break
+        # One walk counts functions and classes and looks for a docstring,
+        # which stops being checked once one is found
+        funcs = classes = 0
+        has_docs = bool(ast.get_docstring(tree))
+        for n in ast.walk(tree):
+            if isinstance(n, ast.FunctionDef):
+                funcs += 1
+            elif isinstance(n, ast.ClassDef):
+                classes += 1
+            else:
+                continue
+            if not has_docs and ast.get_docstring(n):
+                has_docs = True
+        result["functions"] = funcs
+        result["classes"] = classes
         result["has_docstrings"] = has_docs
 
     except SyntaxError as e:
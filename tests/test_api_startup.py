@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ApiStartupTest(unittest.TestCase):
+    def test_server_starts_and_answers_health(self):
+        """`python api.py` (gevent-patched) must boot and serve requests."""
+        env = dict(os.environ, GROQ_API_KEY="", FLASK_DEBUG="0")
+        proc = subprocess.Popen([sys.executable, "api.py"], cwd=ROOT, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                if proc.poll() is not None:
+                    self.fail("api.py exited during startup:\n" + proc.stdout.read().decode(errors="replace"))
+                try:
+                    with urllib.request.urlopen("http://127.0.0.1:5001/api/health", timeout=2) as resp:
+                        self.assertEqual(resp.status, 200)
+                        return
+                except OSError:
+                    if time.monotonic() > deadline:
+                        self.fail("api.py did not answer /api/health within 60s")
+                    time.sleep(0.5)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from language_handlers import _JsonEndScanner
+from llm_utils import extract_fenced
+
+
+def _feed(text, size):
+    """Stream text through a fresh scanner in fixed-size deltas, as _stream_text does."""
+    scanner = _JsonEndScanner()
+    parts = []
+    for i in range(0, len(text), size):
+        parts.append(text[i:i + size])
+        if scanner(parts[-1], parts):
+            break
+    return "".join(parts)
+
+
+class JsonEndScannerTest(unittest.TestCase):
+    def test_bracketed_preamble(self):
+        reply = 'Here is the analysis [JSON]:\n```json\n{"score": 7, "issues": ["a]b"]}\n```\nThanks'
+        for size in (1, 3, 7, len(reply)):
+            text = _feed(reply, size)
+            self.assertEqual(extract_fenced(text.strip(), 'json'), '{"score": 7, "issues": ["a]b"]}')
+
+    def test_bracketed_preamble_batch(self):
+        reply = 'Results [2 files]:\n```json\n[{"file": "a.c"}, {"file": "b.c"}]\n```'
+        for size in (1, 4, len(reply)):
+            text = _feed(reply, size)
+            self.assertEqual(extract_fenced(text.strip(), 'json'), '[{"file": "a.c"}, {"file": "b.c"}]')
+
+    def test_bare_json(self):
+        reply = '  {"score": 3}\ntrailing prose'
+        for size in (1, 5, len(reply)):
+            self.assertEqual(_feed(reply, size), '  {"score": 3}')
+
+    def test_prose_without_payload_reads_to_end(self):
+        reply = 'No [JSON] here, sorry.'
+        self.assertEqual(_feed(reply, 2), reply)
+
+
+if __name__ == '__main__':
+    unittest.main()